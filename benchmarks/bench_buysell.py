@@ -0,0 +1,72 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""
+Benchmarks for HawkesBSI and HawkesBVC evaluation
+"""
+
+import numpy as np
+
+from tseries_patterns.buysell import HawkesBSI, HawkesBVC
+from tseries_patterns.common import Workspace
+
+from .generators import SIZES, hawkes_bars
+
+
+class HawkesBVCEval:
+    params = ([n for n in SIZES if n <= 10**7], [False, True])
+    param_names = ["n", "raw"]
+    timeout = 600
+
+    def setup (self, n, raw):
+        self.bars = hawkes_bars(n)
+        self.bvc = HawkesBVC(window=20, kappa=0.1)
+        self.workspace = Workspace() if raw else None
+        if raw:
+            self.bvc.eval(self.bars, workspace=self.workspace)
+
+    def time_eval (self, n, raw):
+        self.bvc.eval(self.bars, workspace=self.workspace)
+
+    def peakmem_eval (self, n, raw):
+        self.bvc.eval(self.bars, workspace=self.workspace)
+
+
+class HawkesBSIEval:
+    params = ([n for n in SIZES if n <= 10**7], [False, True])
+    param_names = ["n", "raw"]
+    timeout = 600
+
+    def setup (self, n, raw):
+        self.bars = hawkes_bars(n)
+        self.bsi = HawkesBSI(kappa=0.1)
+        self.workspace = Workspace() if raw else None
+        if raw:
+            self.bsi.eval(self.bars, workspace=self.workspace)
+
+    def time_eval (self, n, raw):
+        self.bsi.eval(self.bars, workspace=self.workspace)
+
+    def peakmem_eval (self, n, raw):
+        self.bsi.eval(self.bars, workspace=self.workspace)
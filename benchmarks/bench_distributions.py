@@ -0,0 +1,150 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""
+Benchmarks for EmpiricalDistribution1D, GroupedEmpiricalDistribution1D, and QuantileSketch construction and queries
+"""
+
+import numpy as np
+
+from .generators import SIZES
+
+
+class EmpiricalAddEvent:
+    """
+    Building a distribution from returns, one event at a time and as a list
+    """
+    params = ([n for n in SIZES if n <= 10**6], [100, 1000])
+    param_names = ["n", "bins"]
+    timeout = 600
+
+    def setup (self, n, bins):
+        from tseries_patterns.math.distributions import EmpiricalDistribution1D
+        self.x = np.random.default_rng(1).standard_t(3, n) * 1e-3
+        self.dist = EmpiricalDistribution1D([-0.01, 0.01], bins)
+
+    def time_addEvent (self, n, bins):
+        self.dist.reset()
+        for x in self.x:
+            self.dist.addEvent(x)
+
+    def time_addEventList (self, n, bins):
+        self.dist.reset()
+        self.dist.addEventList(self.x)
+
+    def peakmem_addEventList (self, n, bins):
+        self.dist.reset()
+        self.dist.addEventList(self.x)
+
+
+class EmpiricalQueries:
+    """
+    Quantile and cumulative queries on a populated distribution
+    """
+    params = ([100, 1000, 10000],)
+    param_names = ["bins"]
+
+    def setup (self, bins):
+        from tseries_patterns.math.distributions import EmpiricalDistribution1D
+        self.dist = EmpiricalDistribution1D([-0.01, 0.01], bins)
+        for x in np.random.default_rng(1).standard_t(3, 10000) * 1e-3:
+            self.dist.addEvent(x)
+        self.p = np.linspace(0.01, 0.99, 99)
+        self.x = np.random.default_rng(2).standard_t(3, 10**6) * 1e-3
+
+    def time_icum (self, bins):
+        for p in self.p:
+            self.dist.icum(p)
+
+    def time_cum (self, bins):
+        for p in self.p:
+            self.dist.cum(-0.01 + 0.02 * p)
+
+    def time_icum_vector (self, bins):
+        self.dist.icum(self.p)
+
+    def time_cum_vector (self, bins):
+        self.dist.cum(-0.01 + 0.02 * self.p)
+
+    def time_logf (self, bins):
+        self.dist.logf(self.x)
+
+    def time_sample_icum (self, bins):
+        self.dist.sample(10**6, rng=0, method="icum")
+
+    def time_sample_alias (self, bins):
+        self.dist.sample(10**6, rng=0, method="alias")
+
+
+class GroupedBuild:
+    """
+    Building per-label distributions in one pass vs. filtering and building one distribution per label
+    """
+    params = ([n for n in SIZES if n <= 10**7], [100, 1000])
+    param_names = ["n", "bins"]
+    timeout = 600
+
+    def setup (self, n, bins):
+        rng = np.random.default_rng(1)
+        self.x = rng.standard_t(3, n) * 1e-3
+        self.labels = rng.integers(-1, 2, n).astype(float)
+
+    def time_grouped (self, n, bins):
+        from tseries_patterns.math.distributions import GroupedEmpiricalDistribution1D
+        GroupedEmpiricalDistribution1D([-0.01, 0.01], bins).addEventList(self.x, self.labels)
+
+    def time_filtered (self, n, bins):
+        from tseries_patterns.math.distributions import EmpiricalDistribution1D
+        for label in (-1, 0, 1):
+            EmpiricalDistribution1D([-0.01, 0.01], bins).addEventList(self.x[self.labels == label])
+
+
+class QuantileSketchBuild:
+    """
+    Building a quantile sketch from returns, one event at a time and as a list, and querying quantiles
+    """
+    params = ([n for n in SIZES if n <= 10**6], [100, 400])
+    param_names = ["n", "compression"]
+    timeout = 600
+
+    def setup (self, n, compression):
+        from tseries_patterns.math.distributions import QuantileSketch
+        self.x = np.random.default_rng(1).standard_t(3, n) * 1e-3
+        self.sketch = QuantileSketch(compression)
+        self.sketch.addEventList(self.x)
+        self.p = np.linspace(0.01, 0.99, 99)
+        self.compression = compression
+
+    def time_addEvent (self, n, compression):
+        from tseries_patterns.math.distributions import QuantileSketch
+        sketch = QuantileSketch(compression)
+        for x in self.x:
+            sketch.addEvent(x)
+
+    def time_addEventList (self, n, compression):
+        from tseries_patterns.math.distributions import QuantileSketch
+        QuantileSketch(compression).addEventList(self.x)
+
+    def time_icum_vector (self, n, compression):
+        self.sketch.icum(self.p)
@@ -0,0 +1,91 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""
+Benchmarks for the HMM predictors
+"""
+
+import numpy as np
+
+from .generators import SIZES, regime_series
+
+
+class WalkforwardPredict:
+    """
+    Walk-forward prediction (last state of a trailing window for each point)
+    """
+    params = ([n for n in SIZES if n <= 10**6], [50])
+    param_names = ["n", "window"]
+    timeout = 1800
+
+    def setup (self, n, window):
+        from tseries_patterns.ml.hmm import WalkforwardHMM
+        from tseries_patterns.math.distributions import NormalDistribution
+
+        self.x = regime_series(n)
+        d1 = NormalDistribution(-1.0, 0.7)
+        d2 = NormalDistribution(+1.0, 0.7)
+        trans = np.array([[0.99, 0.01], [0.01, 0.99]])
+        self.hmm = WalkforwardHMM(distributions=[d1.logf, d2.logf], transition_matrix=trans, state_probs=[0.5, 0.5], window=window)
+
+    def teardown (self, n, window):
+        self.hmm.close()
+
+    def time_predict (self, n, window):
+        self.hmm.predict(self.x, cores=4)
+
+
+class WalkforwardIncremental:
+    """
+    Walk-forward prediction with the incremental decoder (each emission evaluated once)
+    """
+    params = ([n for n in SIZES if n <= 10**6], [50])
+    param_names = ["n", "window"]
+    timeout = 1800
+
+    def setup (self, n, window):
+        WalkforwardPredict.setup(self, n, window)
+
+    def time_predict (self, n, window):
+        self.hmm.predict(self.x, incremental=True)
+
+
+class GaussianPredict:
+    """
+    Full-sequence viterbi decoding with HMM3State
+    """
+    params = ([n for n in SIZES if n <= 10**7],)
+    param_names = ["n"]
+    timeout = 600
+
+    def setup (self, n):
+        from tseries_patterns.ml.hmm import HMM3State
+        self.x = regime_series(n, means=(-0.7, 0.0, 0.7), sigma=0.5)
+        self.hmm = HMM3State()
+
+    def time_predict (self, n):
+        self.hmm.predict(self.x)
+
+    def peakmem_predict (self, n):
+        self.hmm.predict(self.x)
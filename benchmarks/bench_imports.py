@@ -0,0 +1,125 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""
+Import-time benchmarks (asv `timeraw_` form), together with a budget check usable as a release gate:
+
+    python -m benchmarks.bench_imports --budget 0.5
+
+The compute kernels must import with numpy alone; plotting (plotnine / matplotlib), pandas, scipy, and the ML
+backends are only to be loaded on first use.
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+
+
+# modules that must not be loaded by importing the core package
+DEFERRED_MODULES = ["pandas", "scipy", "plotnine", "matplotlib", "hmmlearn", "sklearn", "tensorflow"]
+
+# default budget for `import tseries_patterns` (seconds, in a fresh interpreter, including numpy)
+IMPORT_BUDGET = 0.5
+
+CORE_IMPORTS = [
+    "import tseries_patterns",
+    "import tseries_patterns.labelers",
+    "import tseries_patterns.buysell",
+]
+
+
+def timeraw_import_tseries_patterns():
+    return "import tseries_patterns"
+
+
+def timeraw_import_labelers():
+    return "import tseries_patterns.labelers"
+
+
+def timeraw_import_buysell():
+    return "import tseries_patterns.buysell"
+
+
+def import_profile (statement: str, repeat: int = 5) -> dict:
+    """
+    Measure import time of statement in a fresh interpreter, along with deferred modules it loads
+
+    :param statement: import statement to profile
+    :param repeat: number of fresh interpreters to run (the minimum time is reported)
+    :return: dictionary of statement, seconds, and loaded deferred modules
+    """
+    code = (
+        "import sys, time, json\n"
+        "t0 = time.perf_counter()\n"
+        f"{statement}\n"
+        "t1 = time.perf_counter()\n"
+        f"print(json.dumps([t1 - t0, [m for m in {DEFERRED_MODULES!r} if m in sys.modules]]))\n")
+
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        seconds, loaded = json.loads(output.strip().splitlines()[-1])
+        best = seconds if best is None else min(best, seconds)
+
+    return {"statement": statement, "seconds": best, "deferred_loaded": loaded}
+
+
+def check_import_budget (budget: float = IMPORT_BUDGET, repeat: int = 5) -> list:
+    """
+    Check core imports against the time budget and deferred-module rule
+
+    :param budget: maximum import time in seconds
+    :param repeat: number of fresh interpreters per statement
+    :return: list of (profile, failures) for each core import
+    """
+    results = []
+    for statement in CORE_IMPORTS:
+        profile = import_profile(statement, repeat)
+        failures = []
+        if profile["seconds"] > budget:
+            failures.append(f"import time {profile['seconds']:.3f}s exceeds budget of {budget:.3f}s")
+        if len(profile["deferred_loaded"]) > 0:
+            failures.append(f"loads deferred modules: {', '.join(profile['deferred_loaded'])}")
+        results.append((profile, failures))
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="check tseries_patterns import time budget")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET, help="import budget in seconds")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import")
+    args = parser.parse_args()
+
+    ok = True
+    for profile, failures in check_import_budget(args.budget, args.repeat):
+        status = "FAIL" if len(failures) > 0 else "ok"
+        print(f"{status:4s} {profile['seconds']:.3f}s  {profile['statement']}")
+        for failure in failures:
+            print(f"     {failure}")
+        ok = ok and len(failures) == 0
+
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,76 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""
+Benchmarks for AmplitudeBasedLabeler (`_pass1` / `_filter` kernels and dataframe path)
+"""
+
+import numpy as np
+
+from tseries_patterns import AmplitudeBasedLabeler, PriceType
+from tseries_patterns.common import Workspace
+
+from .generators import SIZES, random_walk
+
+
+class LabelerKernels:
+    """
+    Labeling kernels on cumulative bps input, with preallocated output (isolates `_pass1` + `_filter`)
+    """
+    params = ([n for n in SIZES], ["float64", "float32"])
+    param_names = ["n", "dtype"]
+    timeout = 600
+
+    def setup (self, n, dtype):
+        prices = random_walk(n, dtype=np.double)
+        self.cumr = (np.log(prices / prices[0]) * 1e4).astype(dtype)
+        self.labeler = AmplitudeBasedLabeler(minamp=20, Tinactive=10)
+        self.workspace = Workspace()
+        self.out = np.empty(n, dtype=dtype)
+
+    def time_label (self, n, dtype):
+        self.labeler.label(self.cumr, type=PriceType.CUMBPS, out=self.out, workspace=self.workspace)
+
+    def peakmem_label (self, n, dtype):
+        self.labeler.label(self.cumr, type=PriceType.CUMBPS, out=self.out, workspace=self.workspace)
+
+
+class LabelerFrame:
+    """
+    Labeling from price dataframe to labeled dataframe
+    """
+    params = ([n for n in SIZES if n <= 10**7],)
+    param_names = ["n"]
+    timeout = 600
+
+    def setup (self, n):
+        import pandas as pd
+        self.df = pd.DataFrame({'stamp': np.arange(n), 'close': random_walk(n)})
+        self.labeler = AmplitudeBasedLabeler(minamp=20, Tinactive=10)
+
+    def time_label (self, n):
+        self.labeler.label(self.df)
+
+    def peakmem_label (self, n):
+        self.labeler.label(self.df)
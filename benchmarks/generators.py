@@ -0,0 +1,149 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""
+Synthetic data generators for benchmarks: random walks and Hawkes-driven buy / sell volume bars
+"""
+
+import numpy as np
+
+
+# input sizes benchmarked by the parameterized suites
+SIZES = [10**3, 10**4, 10**5, 10**6, 10**7, 10**8]
+
+
+def random_walk (n: int, sigma: float = 1e-3, start: float = 100.0, seed: int = 1, dtype = np.double) -> np.ndarray:
+    """
+    Geometric random walk price series
+
+    :param n: number of samples
+    :param sigma: standard deviation of log returns
+    :param start: starting price
+    :param seed: random seed
+    :param dtype: type of resulting series
+    :return: vector of prices
+    """
+    rng = np.random.default_rng(seed)
+    r = rng.normal(0.0, sigma, n)
+    r[0] = 0.0
+    np.cumsum(r, out=r)
+    np.exp(r, out=r)
+    r *= start
+    return r.astype(dtype, copy=False)
+
+
+def hawkes_counts (n: int, mu: float = 1.0, branching: float = 0.5, decay: float = 0.2, seed: int = 1,
+                   block: int = 1000000) -> np.ndarray:
+    """
+    Event counts per bar of a discrete-time self-exciting (Hawkes) process, simulated through its cluster
+    representation: immigrants arrive as Poisson(mu) per bar, each event spawning Poisson(branching) children
+    at geometrically distributed delays.  Generated in blocks to bound memory.
+
+    :param n: number of bars
+    :param mu: background (immigrant) intensity per bar
+    :param branching: mean number of children per event (< 1 for stationarity)
+    :param decay: exponential decay rate of the excitation kernel (per bar)
+    :param seed: random seed
+    :param block: number of bars generated at a time
+    :return: vector of event counts
+    """
+    rng = np.random.default_rng(seed)
+    pdelay = 1.0 - np.exp(-decay)
+    pad = int(np.ceil(40.0 / pdelay))
+
+    counts = np.empty(n, dtype=np.int64)
+    carry = np.zeros(pad, dtype=np.int64)
+
+    for start in range(0, n, block):
+        L = min(block, n - start)
+        total = np.zeros(L + pad, dtype=np.int64)
+        total[:L] = rng.poisson(mu, L)
+        total[:min(L, pad)] += carry[:min(L, pad)]
+
+        parents = total[:L].copy()
+        while parents.sum() > 0:
+            t = np.repeat(np.arange(L), parents)
+            nchildren = rng.poisson(branching, t.shape[0])
+            tchild = np.repeat(t, nchildren) + rng.geometric(pdelay, int(nchildren.sum()))
+            tchild = tchild[tchild < L + pad]
+
+            children = np.bincount(tchild, minlength=L + pad)
+            total += children
+            parents = children[:L]
+
+        counts[start:start+L] = total[:L]
+        carry = total[L:L+pad]
+
+    return counts
+
+
+def hawkes_bars (n: int, mu: float = 1.0, branching: float = 0.5, decay: float = 0.2, lot: float = 100.0,
+                 sigma: float = 1e-3, impact: float = 1e-5, seed: int = 1, dtype = np.double):
+    """
+    Volume bars with independent self-exciting buy and sell flow, with prices following a random walk
+    plus linear impact of the order imbalance
+
+    :param n: number of bars
+    :param mu: background intensity of buy and sell events per bar
+    :param branching: mean number of children per event
+    :param decay: decay rate of excitation kernel (per bar)
+    :param lot: volume per event
+    :param sigma: standard deviation of (non-impact) log returns
+    :param impact: log return per unit of signed volume
+    :param seed: random seed
+    :param dtype: type of price and volume columns
+    :return: dataframe with stamp, close, buyvolume, sellvolume columns
+    """
+    import pandas as pd
+
+    buy = hawkes_counts(n, mu, branching, decay, seed=seed) * lot
+    sell = hawkes_counts(n, mu, branching, decay, seed=seed+1) * lot
+
+    rng = np.random.default_rng(seed+2)
+    r = rng.normal(0.0, sigma, n) + impact * (buy - sell)
+    r[0] = 0.0
+    prices = 100.0 * np.exp(np.cumsum(r))
+
+    return pd.DataFrame({
+        'stamp': np.arange(n),
+        'close': prices.astype(dtype, copy=False),
+        'buyvolume': buy.astype(dtype, copy=False),
+        'sellvolume': sell.astype(dtype, copy=False)})
+
+
+def regime_series (n: int, means = (-1.0, 1.0), sigma: float = 0.7, ss_prob: float = 0.99, seed: int = 1) -> np.ndarray:
+    """
+    Observations from a markov regime-switching gaussian process, for HMM benchmarks
+
+    :param n: number of samples
+    :param means: mean of each regime
+    :param sigma: standard deviation within regime
+    :param ss_prob: probability of remaining in same regime
+    :param seed: random seed
+    :return: vector of observations
+    """
+    rng = np.random.default_rng(seed)
+    switches = rng.random(n) > ss_prob
+    states = (np.cumsum(switches) % len(means)).astype(np.int64)
+    return np.asarray(means)[states] + rng.normal(0.0, sigma, n)
@@ -0,0 +1,236 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""
+Minimal runner for the asv-style benchmark suites in this directory, for use where asv is not available
+(CI, production hosts).  Benchmarks are discovered from `bench_*.py` modules: classes or functions with
+`time_` and `peakmem_` methods, parameterized through `params` / `param_names` as in asv.  Results are
+emitted as json and may be compared against a stored baseline:
+
+    python -m benchmarks.run --max-size 1e6 --output results.json
+    python -m benchmarks.run --max-size 1e6 --compare baseline.json --threshold 1.25
+
+`time_` benchmarks report the best of `--repeat` runs; `peakmem_` benchmarks report peak bytes allocated
+during the call (numpy allocations included) as tracked by tracemalloc.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import inspect
+import argparse
+import platform
+import itertools
+import importlib
+import subprocess
+import tracemalloc
+
+
+def discover (pattern: str = None) -> list:
+    """
+    Discover benchmarks as (name, owner class or None, method name)
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    found = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.startswith("bench_") or not filename.endswith(".py"):
+            continue
+
+        module = importlib.import_module(f"{__package__}.{filename[:-3]}")
+        for name, obj in inspect.getmembers(module):
+            if inspect.isclass(obj) and obj.__module__ == module.__name__:
+                for method in dir(obj):
+                    if method.startswith("time_") or method.startswith("peakmem_"):
+                        found.append((f"{module.__name__.split('.')[-1]}.{name}.{method}", obj, method))
+            elif inspect.isfunction(obj) and (name.startswith("time_") or name.startswith("peakmem_")):
+                found.append((f"{module.__name__.split('.')[-1]}.{name}", obj, None))
+
+    if pattern is not None:
+        found = [b for b in found if re.search(pattern, b[0])]
+    return found
+
+
+def parameters (obj) -> list:
+    """
+    Expand asv-style params into list of dictionaries
+    """
+    params = getattr(obj, "params", None)
+    if params is None:
+        return [{}]
+    if not isinstance(params, tuple):
+        params = (params,)
+    names = getattr(obj, "param_names", [f"p{i}" for i in range(len(params))])
+    return [dict(zip(names, combo)) for combo in itertools.product(*params)]
+
+
+def run_one (owner, method: str, params: dict, repeat: int) -> dict:
+    """
+    Run single parameterization of a benchmark, returning its measurements (or None if skipped)
+    """
+    args = list(params.values())
+    if method is None:
+        fn = owner
+    else:
+        instance = owner()
+        try:
+            if hasattr(instance, "setup"):
+                instance.setup(*args)
+        except NotImplementedError:
+            return None
+        fn = getattr(instance, method)
+
+    name = method if method is not None else owner.__name__
+    if name.startswith("peakmem_"):
+        tracemalloc.start()
+        try:
+            fn(*args)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result = {"peak_bytes": peak}
+    else:
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(*args)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        result = {"seconds": best}
+        if "n" in params and best > 0:
+            result["rows_per_sec"] = params["n"] / best
+
+    if method is not None and hasattr(instance, "teardown"):
+        instance.teardown(*args)
+    return result
+
+
+def environment () -> dict:
+    """
+    Describe environment the benchmarks ran in
+    """
+    import numpy
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def run (pattern: str = None, max_size: float = 1e6, repeat: int = 3, verbose: bool = True) -> dict:
+    """
+    Run discovered benchmarks up to given input size
+
+    :param pattern: regular expression selecting benchmarks by name
+    :param max_size: largest `n` parameter to run
+    :param repeat: number of timing repetitions (best is reported)
+    :return: results document
+    """
+    results = []
+    for name, owner, method in discover(pattern):
+        for params in parameters(owner):
+            if "n" in params and params["n"] > max_size:
+                continue
+            measurement = run_one(owner, method, params, repeat)
+            if measurement is None:
+                continue
+            record = {"benchmark": name, "params": params}
+            record.update(measurement)
+            results.append(record)
+            if verbose:
+                print(_format(record), file=sys.stderr)
+
+    return {"environment": environment(), "results": results}
+
+
+def compare (current: dict, baseline: dict, threshold: float = 1.25) -> list:
+    """
+    Compare results against baseline, yielding records whose time or peak memory ratio exceeds threshold
+    (regression) or falls below 1 / threshold (improvement)
+
+    :return: list of (benchmark, params, metric, baseline value, current value, ratio, status)
+    """
+    def key (record):
+        return (record["benchmark"], json.dumps(record["params"], sort_keys=True))
+
+    prior = {key(r): r for r in baseline["results"]}
+    changes = []
+    for record in current["results"]:
+        old = prior.get(key(record))
+        if old is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if metric not in record or metric not in old or old[metric] <= 0:
+                continue
+            ratio = record[metric] / old[metric]
+            if ratio > threshold:
+                changes.append((record["benchmark"], record["params"], metric, old[metric], record[metric], ratio, "regression"))
+            elif ratio < 1.0 / threshold:
+                changes.append((record["benchmark"], record["params"], metric, old[metric], record[metric], ratio, "improvement"))
+
+    return changes
+
+
+def _format (record: dict) -> str:
+    params = ", ".join(f"{k}={v}" for k, v in record["params"].items())
+    if "seconds" in record:
+        value = f"{record['seconds']:.6f}s"
+    else:
+        value = f"{record['peak_bytes'] / 1e6:.3f}MB"
+    return f"{record['benchmark']:55s} {params:30s} {value}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="run tseries_patterns benchmarks")
+    parser.add_argument("--bench", default=None, help="regular expression selecting benchmarks")
+    parser.add_argument("--max-size", type=float, default=1e6, help="largest input size to run (up to 1e8)")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions")
+    parser.add_argument("--output", default=None, help="file to write json results to (default stdout)")
+    parser.add_argument("--compare", default=None, help="baseline json results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio considered a significant change")
+    args = parser.parse_args()
+
+    current = run(args.bench, args.max_size, args.repeat)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=1)
+    elif args.compare is None:
+        json.dump(current, sys.stdout, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changes = compare(current, baseline, args.threshold)
+        for benchmark, params, metric, old, new, ratio, status in changes:
+            print(f"{status:11s} {benchmark} {params} {metric}: {old:.6g} -> {new:.6g} ({ratio:.2f}x)")
+        sys.exit(1 if any(c[-1] == "regression" for c in changes) else 0)
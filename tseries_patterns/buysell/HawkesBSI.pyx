@@ -22,19 +22,20 @@
 # SOFTWARE.
 #
 
-import pandas as pd
 import numpy as np
+from cython cimport floating
 
-import plotnine
-from plotnine import *
+from ..common import Workspace, stage
 
-from ..common.rendering import scale_x_datetime_auto, new_grid
-from ..common.utils import columnFor
+# pandas, plotnine, and rendering support are imported on first use, keeping import of the kernel light
 
 
 cdef class HawkesBSI:
     """
     Use a hawkes process to model a self-exciting buy/sell imbalance signal
+
+    The BSI is produced in float32 where buy and sell volumes are float32 (or `out` is float32), otherwise in
+    float64.  The recursion accumulates in double in either case.
     """
     cdef double _kappa
     cdef object _metrics
@@ -45,26 +46,62 @@ cdef class HawkesBSI:
         """
         self._kappa = kappa
 
-    def eval (self, df: pd.DataFrame):
-        """
-        Compute buy/sell imbalance on bar / volume timeseries
-        """
+    def __reduce__(self):
+        return (self.__class__, (self._kappa,), (self._metrics,))
 
-        if isinstance(df.index, pd.DatetimeIndex):
-            times = df.index
-        else:
-            times = columnFor(df, ['stamp','time','Date','date','datetime'])
+    def __setstate__(self, state):
+        self._metrics, = state
 
-        prices = columnFor(df, ['close','Close','price'])
-        buyvol = columnFor(df, ['buyvolume', 'BuyVolume'])
-        sellvol = columnFor(df, ['sellvolume', 'SellVolume'])
+    def eval (self, df, out = None, workspace = None):
+        """
+        Compute buy/sell imbalance on bar / volume timeseries
 
-        dv = buyvol - sellvol
-        alpha = np.exp (-self._kappa)
-        bsi = np.zeros(dv.shape[0], dtype=float)
+        When `out` and / or `workspace` are supplied, the raw BSI vector is returned instead of a
+        dataframe, and repeated calls on equal-sized inputs do no further allocation.
 
-        self._compute_bsi (bsi, np.array(dv.values, dtype=float), alpha)
-        self._metrics = pd.DataFrame({'stamp': times, 'price': prices, 'bsi': bsi})
+        :param df: dataframe with buy and sell volume columns
+        :param out: (optional) preallocated BSI vector of same length as df, written in place
+        :param workspace: (optional) workspace providing reusable scratch buffers
+        :return: dataframe of stamp, price, and bsi, or raw BSI vector if `out` or `workspace` given
+        """
+        from ..common.utils import columnFor
+
+        raw = out is not None or workspace is not None
+        if workspace is None:
+            workspace = Workspace()
+
+        n = len(df)
+        with stage ("HawkesBSI.columnFor", n):
+            buyvol = columnFor(df, ['buyvolume', 'BuyVolume']).values
+            sellvol = columnFor(df, ['sellvolume', 'SellVolume']).values
+
+        if out is None:
+            single = buyvol.dtype == np.float32 and sellvol.dtype == np.float32
+            out = workspace.buffer ("bsi", n, np.float32 if single else np.double)
+        elif out.shape[0] != n:
+            raise Exception (f"output vector length {out.shape[0]} does not match input length {n}")
+        elif out.dtype != np.float32 and out.dtype != np.double:
+            raise Exception (f"output vector must be float32 or float64, got {out.dtype}")
+
+        with stage ("HawkesBSI.imbalance", n):
+            dv = np.subtract (buyvol, sellvol, out=workspace.buffer ("dv", n, out.dtype))
+
+        with stage ("HawkesBSI._compute_bsi", n):
+            alpha = np.exp (-self._kappa)
+            self._run (out, dv, alpha)
+        if raw:
+            return out
+
+        import pandas as pd
+
+        with stage ("HawkesBSI.frame", n):
+            if isinstance(df.index, pd.DatetimeIndex):
+                times = df.index
+            else:
+                times = columnFor(df, ['stamp','time','Date','date','datetime'])
+
+            prices = columnFor(df, ['close','Close','price'])
+            self._metrics = pd.DataFrame({'stamp': times, 'price': prices, 'bsi': out})
         return self._metrics
 
     def plot(
@@ -84,6 +121,11 @@ cdef class HawkesBSI:
         :param title: title associated with graph
         :return:
         """
+        import pandas as pd
+        import plotnine
+        from plotnine import ggplot, aes, geom_line, labs
+        from ..common.rendering import scale_x_datetime_auto, new_grid
+
         if Tstart is None:
             Tstart = self._metrics["stamp"].iloc[0]
         if Tend is None:
@@ -105,7 +147,25 @@ cdef class HawkesBSI:
         return v
 
 
-    cdef _compute_bsi (self, double[:] out, double[:] dv, double df):
+    cdef _run (self, out, dv, double alpha):
+        """
+        Dispatch to the kernel specialization matching the output precision
+        """
+        cdef float[:] out_f
+        cdef float[:] dv_f
+        cdef double[:] out_d
+        cdef double[:] dv_d
+
+        if out.dtype == np.float32:
+            out_f = out
+            dv_f = dv
+            self._compute_bsi (out_f, dv_f, alpha)
+        else:
+            out_d = out
+            dv_d = dv
+            self._compute_bsi (out_d, dv_d, alpha)
+
+    cdef _compute_bsi (self, floating[:] out, floating[:] dv, double df):
         cdef double bsi = 0.0
         for i in range(dv.shape[0]):
             bsi = bsi * df + dv[i]
@@ -22,20 +22,23 @@
 # SOFTWARE.
 #
 
-import pandas as pd
 import numpy as np
-from scipy.stats import t as studentt
+from libc.math cimport sqrt
+from cython cimport floating
 
-import plotnine
-from plotnine import *
+from ..common import Workspace, stage
 
-from ..common.rendering import scale_x_datetime_auto, new_grid
-from ..common.utils import columnFor
+# pandas, scipy, plotnine, and rendering support are imported on first use, keeping import of the kernel light
 
 
 cdef class HawkesBVC:
     """
     Use a hawkes process to model a self-exciting overlay on top of the BVC (bulk volume classifier)
+
+    The BVC is produced in float32 where prices are float32 (or `out` is float32), otherwise in float64.
+    Returns, labels, and volumes are then held in float32, whereas the rolling volatility and BVC
+    recursions accumulate in double.  As returns are differenced from float32 cumulative log returns, expect
+    relative differences of order 1e-4 against float64 evaluation.
     """
     cdef int _window
     cdef double _kappa
@@ -52,35 +55,97 @@ cdef class HawkesBVC:
         self._kappa = kappa
         self._dof = dof
 
-    def eval (self, df: pd.DataFrame):
+    def __reduce__(self):
+        return (self.__class__, (self._window, self._kappa, self._dof), (self._metrics,))
+
+    def __setstate__(self, state):
+        self._metrics, = state
+
+    def eval (self, df, out = None, workspace = None):
         """
         Compute BVC on bar / volume timeseries
+
+        When `out` and / or `workspace` are supplied, the raw BVC vector is returned instead of a
+        dataframe, and repeated calls on equal-sized inputs do no further allocation.
+
+        :param df: dataframe with price and volume (or buy and sell volume) columns
+        :param out: (optional) preallocated BVC vector of same length as df, written in place
+        :param workspace: (optional) workspace providing reusable scratch buffers
+        :return: dataframe of stamp, price, and bvc, or raw BVC vector if `out` or `workspace` given
         """
+        from scipy.special import stdtr
+        from ..common.utils import columnFor
 
-        if isinstance(df.index, pd.DatetimeIndex):
-            times = df.index
-        else:
-            times = columnFor(df, ['stamp','time','Date','date','datetime'])
+        raw = out is not None or workspace is not None
+        if workspace is None:
+            workspace = Workspace()
 
-        prices = columnFor(df, ['close','Close','price'])
-        cumr = np.log(prices / prices.iloc[0])
-        r = cumr.diff().fillna(0.0)
+        n = len(df)
+        with stage ("HawkesBVC.columnFor", n):
+            prices = columnFor(df, ['close','Close','price'])
+            if "volume" in df.columns or "Volume" in df.columns:
+                vol = columnFor(df, ['volume', 'Volume']).values
+                buyvol = sellvol = None
+            else:
+                vol = None
+                buyvol = columnFor(df, ['buyvolume', 'BuyVolume']).values
+                sellvol = columnFor(df, ['sellvolume', 'SellVolume']).values
 
-        if "volume" in df.columns or "Volume" in df.columns:
-            volume = columnFor(df, ['volume', 'Volume'])
-        else:
-            buyvol = columnFor(df, ['buyvolume', 'BuyVolume'])
-            sellvol = columnFor(df, ['sellvolume', 'SellVolume'])
-            volume = buyvol + sellvol
+        if out is None:
+            out = workspace.buffer ("bvc", n, np.float32 if prices.dtype == np.float32 else np.double)
+        elif out.shape[0] != n:
+            raise Exception (f"output vector length {out.shape[0]} does not match input length {n}")
+        elif out.dtype != np.float32 and out.dtype != np.double:
+            raise Exception (f"output vector must be float32 or float64, got {out.dtype}")
+
+        dtype = out.dtype
+
+        # returns from cumulative log returns
+        with stage ("HawkesBVC.returns", n):
+            p = prices.values
+            cumr = workspace.buffer ("cumr", n, dtype)
+            r = workspace.buffer ("r", n, dtype)
+            np.divide (p, p[0], out=cumr)
+            np.log (cumr, out=cumr)
+            np.subtract (cumr[1:], cumr[:-1], out=r[1:])
+            r[0] = 0.0
+
+            volume = workspace.buffer ("volume", n, dtype)
+            if vol is not None:
+                np.copyto (volume, vol)
+            else:
+                np.add (buyvol, sellvol, out=volume)
+
+        with stage ("HawkesBVC.rolling_std", n):
+            sigma = workspace.buffer ("sigma", n, dtype)
+            self._run_rolling_std (sigma, r)
+
+        # student-t based labels, 2 * cdf(r / sigma) - 1, or 0 where sigma is 0
+        with stage ("HawkesBVC.labels", n):
+            labels = workspace.buffer ("labels", n, dtype)
+            valid = workspace.buffer ("valid", n, np.bool_)
+            np.greater (sigma, 0.0, out=valid)
+            labels.fill (0.0)
+            np.divide (r, sigma, out=labels, where=valid)
+            stdtr (dtype.type(self._dof), labels, out=labels)
+            np.multiply (labels, 2.0, out=labels)
+            np.subtract (labels, 1.0, out=labels)
+
+        with stage ("HawkesBVC._compute_bvc", n):
+            alpha = np.exp (-self._kappa)
+            self._run_bvc (out, volume, labels, alpha)
+        if raw:
+            return out
 
-        sigma = r.rolling(self._window).std().fillna(0.0)
-        alpha = np.exp (-self._kappa)
-        labels = np.array([self._label(r[i], sigma[i]) for i in range(df.shape[0])])
+        import pandas as pd
 
-        bvc = np.zeros(df.shape[0], dtype=float)
+        with stage ("HawkesBVC.frame", n):
+            if isinstance(df.index, pd.DatetimeIndex):
+                times = df.index
+            else:
+                times = columnFor(df, ['stamp','time','Date','date','datetime'])
 
-        self._compute_bvc (bvc, volume.values, labels, alpha)
-        self._metrics = pd.DataFrame({'stamp': times, 'price': prices, 'bvc': bvc})
+            self._metrics = pd.DataFrame({'stamp': times, 'price': prices, 'bvc': out})
         return self._metrics
 
     def plot(
@@ -98,6 +163,11 @@ cdef class HawkesBVC:
         :param title: title associated with graph
         :return:
         """
+        import pandas as pd
+        import plotnine
+        from plotnine import ggplot, aes, geom_line, labs
+        from ..common.rendering import scale_x_datetime_auto, new_grid
+
         df1 = pd.DataFrame({'stamp': self._metrics["stamp"], 'price': self._metrics["price"], 'pane': ' price'})
         df2 = pd.DataFrame({'stamp': self._metrics["stamp"], 'value': self._metrics["bvc"], 'pane': 'BVC'})
 
@@ -112,18 +182,81 @@ cdef class HawkesBVC:
         return v
 
 
-    def _label (self, r: float, sigma: float):
-        if sigma > 0.0:
-            cum = studentt.cdf(r / sigma, df = self._dof)
-            return 2 * cum - 1.0
+    cdef _run_rolling_std (self, out, r):
+        """
+        Dispatch to the rolling std specialization matching the output precision
+        """
+        cdef float[:] out_f
+        cdef float[:] r_f
+        cdef double[:] out_d
+        cdef double[:] r_d
+
+        if out.dtype == np.float32:
+            out_f = out
+            r_f = r
+            self._rolling_std (out_f, r_f, self._window)
+        else:
+            out_d = out
+            r_d = r
+            self._rolling_std (out_d, r_d, self._window)
+
+    cdef _run_bvc (self, out, volume, labels, double alpha):
+        """
+        Dispatch to the BVC specialization matching the output precision
+        """
+        cdef float[:] out_f
+        cdef float[:] volume_f
+        cdef float[:] labels_f
+        cdef double[:] out_d
+        cdef double[:] volume_d
+        cdef double[:] labels_d
+
+        if out.dtype == np.float32:
+            out_f = out
+            volume_f = volume
+            labels_f = labels
+            self._compute_bvc (out_f, volume_f, labels_f, alpha)
         else:
-            return 0.0
+            out_d = out
+            volume_d = volume
+            labels_d = labels
+            self._compute_bvc (out_d, volume_d, labels_d, alpha)
 
-    cdef _compute_bvc (self, double[:] out, double[:] volume, double[:] labels, double df):
+    cdef _compute_bvc (self, floating[:] out, floating[:] volume, floating[:] labels, double df):
         cdef double bvc = 0.0
         for i in range(volume.shape[0]):
             bvc = bvc * df + volume[i] * labels[i]
             out[i] = bvc
 
+    cdef _rolling_std (self, floating[:] out, floating[:] r, int window):
+        """
+        Rolling sample standard deviation (as with pandas rolling(window).std()), with 0 where undefined
+        """
+        cdef int n = r.shape[0]
+        cdef int nobs = 0
+        cdef double mean = 0.0
+        cdef double ssq = 0.0
+        cdef double delta = 0.0
+        cdef double x = 0.0
+        cdef int i = 0
+
+        for i in range(n):
+            # add newest observation
+            x = r[i]
+            nobs += 1
+            delta = x - mean
+            mean += delta / nobs
+            ssq += delta * (x - mean)
 
+            # remove observation falling out of window
+            if i >= window:
+                x = r[i - window]
+                nobs -= 1
+                delta = x - mean
+                mean -= delta / nobs
+                ssq -= delta * (x - mean)
 
+            if i >= window-1 and nobs > 1 and ssq > 0.0:
+                out[i] = sqrt(ssq / (nobs - 1))
+            else:
+                out[i] = 0.0
@@ -0,0 +1,281 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import io
+import sys
+import json
+import unittest
+import time
+import tracemalloc
+
+
+# active recorder (None when instrumentation is disabled)
+_recorder = None
+
+
+class Instrumentation:
+    """
+    Opt-in recorder of per-stage wall time, throughput, and allocation for the labeler, Hawkes, and HMM
+    estimators.  Stages are only recorded while the recorder is active:
+
+        with Instrumentation(memory=True) as inst:
+            labeler.label(df)
+
+        inst.summary()
+        inst.toJsonLines("stages.jsonl")
+
+    When no recorder is active, `stage` hands back a shared no-op context, so instrumented code pays only
+    a function call per stage (never per row).
+
+    Allocated bytes are tracked with tracemalloc (which also sees numpy allocations) when `memory` is
+    enabled.  `bytes` is the net change in traced memory over the stage and `peak_bytes` the peak above the
+    starting level; nested stages reset the peak, so the peak of an enclosing stage is a lower bound.
+    """
+
+    def __init__(self, memory: bool = False, callbacks: list = None):
+        """
+        :param memory: whether to track allocated bytes (enables tracemalloc while active, which adds overhead)
+        :param callbacks: functions called with each stage record as it completes
+        """
+        self.memory = memory
+        self.records = []
+        self._callbacks = list(callbacks) if callbacks is not None else []
+        self._prior = None
+        self._started_tracing = False
+
+
+    def __enter__(self):
+        global _recorder
+        self._prior = _recorder
+        _recorder = self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+
+    def __exit__(self, *exc):
+        global _recorder
+        _recorder = self._prior
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+
+    def addCallback (self, fn):
+        """
+        Register function to be called with each stage record as it completes
+        """
+        self._callbacks.append(fn)
+
+
+    def record (self, name: str, seconds: float, rows: int, allocated: int = None, peak: int = None):
+        """
+        Record completed stage
+        """
+        rec = {
+            'stage': name,
+            'seconds': seconds,
+            'rows': rows,
+            'rows_per_sec': rows / seconds if rows > 0 and seconds > 0 else None}
+        if allocated is not None:
+            rec['bytes'] = allocated
+            rec['peak_bytes'] = peak
+
+        self.records.append(rec)
+        for fn in self._callbacks:
+            fn(rec)
+
+
+    def toDicts (self) -> list:
+        """
+        Stage records as list of dictionaries
+        """
+        return [dict(rec) for rec in self.records]
+
+
+    def summary (self) -> dict:
+        """
+        Totals by stage: calls, seconds, rows, rows / sec, and (if tracked) bytes and maximum peak bytes
+        """
+        totals = {}
+        for rec in self.records:
+            total = totals.setdefault(rec['stage'], {'calls': 0, 'seconds': 0.0, 'rows': 0})
+            total['calls'] += 1
+            total['seconds'] += rec['seconds']
+            total['rows'] += rec['rows']
+            if 'bytes' in rec:
+                total['bytes'] = total.get('bytes', 0) + rec['bytes']
+                total['peak_bytes'] = max(total.get('peak_bytes', 0), rec['peak_bytes'])
+
+        for total in totals.values():
+            total['rows_per_sec'] = total['rows'] / total['seconds'] if total['rows'] > 0 and total['seconds'] > 0 else None
+        return totals
+
+
+    def toJsonLines (self, file = None) -> str:
+        """
+        Stage records in json lines form
+
+        :param file: (optional) path or file object to write to
+        :return: json lines text
+        """
+        text = "".join(json.dumps(rec) + "\n" for rec in self.records)
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                f.write(text)
+        elif file is not None:
+            file.write(text)
+        return text
+
+
+    def clear (self):
+        """
+        Discard recorded stages
+        """
+        self.records = []
+
+
+class _NullStage:
+    """
+    No-op stage used when instrumentation is disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """
+    Stage being timed by an active recorder
+    """
+    __slots__ = ('_recorder', '_name', '_rows', '_t0', '_m0')
+
+    def __init__(self, recorder, name, rows):
+        self._recorder = recorder
+        self._name = name
+        self._rows = rows
+
+    def __enter__(self):
+        if self._recorder.memory:
+            self._m0 = tracemalloc.get_traced_memory()[0]
+            if sys.version_info >= (3, 9):
+                tracemalloc.reset_peak()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._t0
+        if self._recorder.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            self._recorder.record(self._name, elapsed, self._rows, current - self._m0, max(0, peak - self._m0))
+        else:
+            self._recorder.record(self._name, elapsed, self._rows)
+        return False
+
+
+def stage (name: str, rows: int = 0):
+    """
+    Context manager around an instrumented stage of computation
+
+    :param name: name of stage (by convention <Class>.<stage>)
+    :param rows: number of rows processed by the stage (for throughput)
+    :return: timing context if instrumentation is active, otherwise a shared no-op context
+    """
+    if _recorder is None:
+        return _NULL_STAGE
+    return _Stage(_recorder, name, rows)
+
+
+##
+##  UNIT TESTS
+##
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_disabled(self):
+        self.assertIsNone (_recorder)
+        with stage ("Test.disabled", 10) as ctx:
+            pass
+        self.assertIs (ctx, _NULL_STAGE)
+        self.assertIs (stage ("Test.other"), _NULL_STAGE)
+
+        ## a recorder no longer active records nothing further
+        with Instrumentation() as inst:
+            pass
+        with stage ("Test.after", 10):
+            pass
+        self.assertEqual (inst.records, [])
+
+
+    def test_enabled(self):
+        seen = []
+        with Instrumentation(callbacks=[seen.append]) as inst:
+            with stage ("Test.outer", 1000):
+                with stage ("Test.inner", 10):
+                    time.sleep (0.01)
+            with stage ("Test.inner", 30):
+                pass
+
+        self.assertIsNone (_recorder)
+        self.assertEqual ([rec['stage'] for rec in inst.records], ["Test.inner", "Test.outer", "Test.inner"])
+        self.assertEqual (seen, inst.records)
+        self.assertGreaterEqual (inst.records[0]['seconds'], 0.01)
+        self.assertGreaterEqual (inst.records[1]['seconds'], inst.records[0]['seconds'])
+        self.assertNotIn ('bytes', inst.records[0])
+
+        totals = inst.summary()
+        self.assertEqual (totals["Test.inner"]['calls'], 2)
+        self.assertEqual (totals["Test.inner"]['rows'], 40)
+        self.assertEqual (totals["Test.outer"]['rows'], 1000)
+
+        out = io.StringIO()
+        inst.toJsonLines (out)
+        self.assertEqual ([json.loads(line) for line in out.getvalue().splitlines()], inst.toDicts())
+
+
+    def test_memory(self):
+        with Instrumentation(memory=True) as inst:
+            with stage ("Test.alloc", 1):
+                block = bytearray (1 << 20)
+            self.assertTrue (tracemalloc.is_tracing())
+
+        self.assertFalse (tracemalloc.is_tracing())
+        self.assertGreaterEqual (inst.records[0]['bytes'], 1 << 19)
+        self.assertGreaterEqual (inst.records[0]['peak_bytes'], inst.records[0]['bytes'])
+        del block
+
+
+
+if __name__ == '__main__':
+
+    unittest.main()
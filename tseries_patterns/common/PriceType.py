@@ -24,7 +24,6 @@
 
 from enum import Enum
 import numpy as np
-import pandas as pd
 
 class PriceType(Enum):
 
@@ -32,18 +31,37 @@ class PriceType(Enum):
     CUMBPS = 2
     CUMR = 3
 
-    def toBps (self, prices, scale = 1e4):
+    def toBps (self, prices, scale = 1e4, out = None):
+        """
+        Convert prices into cumulative return form (bps when scale = 1e4)
+
+        :param prices: vector of prices, cumulative bps, or cumulative returns
+        :param scale: scaling applied to cumulative returns
+        :param out: (optional) preallocated vector to write result into, avoiding allocation
+        :return: cumulative (scaled) returns
+        """
         # 1st get into numpy array form
         if isinstance(prices, np.ndarray):
             pass
-        elif isinstance (prices, pd.Series):
+        elif hasattr (prices, "values"):
             prices = np.array(prices.values)
         else:
             prices = np.array(prices)
 
+        if out is None:
+            if self.value == 2:
+                return prices
+            elif self.value == 1:
+                return np.log(prices / prices[0]) * scale
+            else:
+                return prices * scale
+
         if self.value == 2:
-            return prices
+            np.copyto(out, prices)
         elif self.value == 1:
-            return np.log(prices / prices[0]) * scale
+            np.divide(prices, prices[0], out=out)
+            np.log(out, out=out)
+            np.multiply(out, scale, out=out)
         else:
-            return prices * scale
+            np.multiply(prices, scale, out=out)
+        return out
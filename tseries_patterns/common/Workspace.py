@@ -0,0 +1,68 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import numpy as np
+
+
+class Workspace:
+    """
+    Set of named scratch buffers that can be reused across repeated evaluations.
+
+    Buffers are only (re)allocated when the requested length or dtype changes, hence repeated calls
+    on equal-sized inputs do not allocate.  A workspace is not thread-safe; use one per thread.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+
+    def buffer (self, name: str, n: int, dtype = np.double):
+        """
+        Get scratch buffer of given length and type, reusing prior allocation where possible
+
+        :param name: name of buffer (unique within the workspace)
+        :param n: length of buffer
+        :param dtype: numpy type of buffer
+        :return: uninitialized buffer of length n
+        """
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape[0] != n or buf.dtype != dtype:
+            buf = np.empty(n, dtype=dtype)
+            self._buffers[name] = buf
+        return buf
+
+
+    def clear (self):
+        """
+        Release all buffers
+        """
+        self._buffers = {}
+
+
+    @property
+    def nbytes (self) -> int:
+        """
+        Total number of bytes held by workspace buffers
+        """
+        return sum(buf.nbytes for buf in self._buffers.values())
@@ -1,3 +1,5 @@
 from .PriceType import PriceType
+from .Workspace import Workspace
+from .Instrumentation import Instrumentation, stage
 
 
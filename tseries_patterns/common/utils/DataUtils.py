@@ -24,8 +24,7 @@
 
 import numpy as np
 import pandas as pd
-from collections import Iterable
-from scipy.stats import *
+from collections.abc import Iterable
 
 def columnFor (df: pd.DataFrame, names: list):
     """
@@ -121,6 +120,8 @@ def summary(series):
     """
     Descriptive statistics for series
     """
+    from scipy.stats import skew, kurtosis
+
     idx = ['mean', 'std', 'skew', 'kurtosis', 'min', '25%', 'median', '75%', 'max']
 
     def statistics (v):
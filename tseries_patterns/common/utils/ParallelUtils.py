@@ -0,0 +1,155 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import pickle
+import unittest
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+def batch_eval (estimator, inputs: list, method: str = None, dtype = np.double, processes: int = None) -> list:
+    """
+    Evaluate an estimator (such as AmplitudeBasedLabeler, HawkesBSI, or HawkesBVC) across a batch of series
+    in a process pool.  Workers write their results directly into a shared memory block (by way of the
+    estimator's `out=` argument), so only the estimator and inputs are pickled, never the result frames.
+
+    :param estimator: picklable estimator whose `method` accepts a series and an `out=` vector
+    :param inputs: list of series (price vectors or bar dataframes), one per job
+    :param method: name of the evaluation method (default: `label` if present, otherwise `eval`)
+    :param dtype: type of the result vectors (float32 or float64)
+    :param processes: number of worker processes (default: # of cores)
+    :return: list of result vectors, one per input
+    """
+    if method is None:
+        method = "label" if hasattr(estimator, "label") else "eval"
+    if len(inputs) == 0:
+        return []
+
+    dtype = np.dtype(dtype)
+    lengths = [len(x) for x in inputs]
+    offsets = np.concatenate (([0], np.cumsum(lengths))).astype(np.int64)
+    total = int(offsets[-1])
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, total * dtype.itemsize))
+    try:
+        jobs = [
+            (estimator, method, x, shm.name, int(offsets[i]) * dtype.itemsize, lengths[i], dtype.str)
+            for i, x in enumerate(inputs)]
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for _ in pool.map(_batch_worker, jobs):
+                pass
+
+        block = np.ndarray((total,), dtype=dtype, buffer=shm.buf)
+        results = np.array(block)
+        del block
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return np.split (results, offsets[1:-1])
+
+
+##
+## External function evaluating one series within a worker
+##
+def _batch_worker (job):
+    estimator, method, x, name, offset, n, dtype = job
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        out = np.ndarray((n,), dtype=dtype, buffer=shm.buf, offset=offset)
+        getattr(estimator, method) (x, out=out)
+        del out
+    finally:
+        shm.close()
+
+
+##
+##  UNIT TESTS
+##
+
+class TestParallelUtils(unittest.TestCase):
+
+    def setUp(self):
+        from tseries_patterns.labelers import AmplitudeBasedLabeler
+        from tseries_patterns.buysell import HawkesBSI, HawkesBVC
+
+        rng = np.random.default_rng(1)
+        self._prices = [100.0 * np.exp(np.cumsum(rng.normal(0.0, 1e-3, n))) for n in (5000, 1, 12000, 800)]
+        self._bars = [
+            pd.DataFrame({
+                'stamp': np.arange(len(p)),
+                'close': p,
+                'buyvolume': rng.poisson(5.0, len(p)) * 100.0,
+                'sellvolume': rng.poisson(5.0, len(p)) * 100.0})
+            for p in self._prices]
+
+        self._estimators = [
+            (AmplitudeBasedLabeler (minamp = 20, Tinactive = 10), self._prices),
+            (HawkesBSI (0.1), self._bars),
+            (HawkesBVC (10, 0.1), self._bars)]
+
+
+    def test_pickle(self):
+        frames = [[bars[['stamp','close']] for bars in self._bars], self._bars, self._bars]
+
+        for (estimator, inputs), frames in zip(self._estimators, frames):
+            method = "label" if hasattr(estimator, "label") else "eval"
+            before = getattr(estimator, method) (frames[0])
+
+            clone = pickle.loads (pickle.dumps (estimator))
+            self.assertIs (type(clone), type(estimator))
+            self.assertEqual (clone.__reduce__()[1], estimator.__reduce__()[1])
+            pd.testing.assert_frame_equal (clone.__reduce__()[2][0], estimator.__reduce__()[2][0])
+
+            ## state carried over from the last evaluation and output on new series match the original
+            pd.testing.assert_frame_equal (getattr(clone, method) (frames[0]), before)
+            for x in inputs[2:]:
+                expected = getattr(estimator, method) (x, out=np.empty(len(x)))
+                self.assertTrue (np.array_equal (getattr(clone, method) (x, out=np.empty(len(x))), expected, equal_nan=True))
+
+
+    def test_batch_eval(self):
+        for estimator, inputs in self._estimators:
+            method = "label" if hasattr(estimator, "label") else "eval"
+            serial = [getattr(estimator, method) (x, out=np.empty(len(x))) for x in inputs]
+
+            for dtype, processes in [(np.double, 1), (np.double, 3), (np.float32, 2)]:
+                results = batch_eval (estimator, inputs, dtype=dtype, processes=processes)
+
+                self.assertEqual ([len(r) for r in results], [len(x) for x in inputs])
+                for r, expected in zip(results, serial):
+                    self.assertEqual (r.dtype, np.dtype(dtype))
+                    if dtype is np.double:
+                        self.assertTrue (np.array_equal (r, expected, equal_nan=True))
+
+        self.assertEqual (batch_eval (self._estimators[0][0], []), [])
+
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -1,3 +1,4 @@
 from .Comparisons import isZero, LE, LT, GE, GT, EQ, constrain, frange
 from .DataUtils import columnFor, cbind, breaks, ncols, nrows
+from .ParallelUtils import batch_eval
 
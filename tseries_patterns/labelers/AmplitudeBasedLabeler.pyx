@@ -23,15 +23,19 @@
 #
 
 
-import pandas as pd
 import numpy as np
+from cython cimport floating
 
-import plotnine
-from plotnine import *
+from tseries_patterns.common import PriceType, Workspace, stage
 
-from tseries_patterns.common import PriceType
-from tseries_patterns.common.rendering import scale_x_datetime_auto
-from tseries_patterns.common.utils import columnFor
+# pandas, plotnine, and rendering support are imported on first use, keeping import of the kernel light
+
+
+def _precision (dtype):
+    """
+    Kernel precision for given input type: float32 is preserved, all else is computed in float64
+    """
+    return np.float32 if dtype == np.float32 else np.double
 
 
 cdef int max (int a, int b):
@@ -58,6 +62,11 @@ cdef class AmplitudeBasedLabeler:
     cumr = np.log(prices / prices[0]) * 1e4
 
     Amplitude `minamp` can then be defined as, say, 25bps instead of amplitude in price terms.
+
+    Labeling is carried out in the precision of the input: float32 series are labeled in float32 (halving
+    memory), anything else in float64.  Kernel arithmetic is done in double in both cases, so the only source
+    of difference between the two is the float32 rounding of the cumulative return series (~1e-7 relative),
+    which can move a label boundary by a sample where a move is within rounding of `minamp`.
     """
 
     cdef double minamp
@@ -76,32 +85,116 @@ cdef class AmplitudeBasedLabeler:
         self.df = None
 
 
-    def label (self, prices, type = PriceType.PRICE, scale = 1e4):
+    def __reduce__(self):
+        return (self.__class__, (self.minamp, self.Tinactive), (self.df,))
+
+
+    def __setstate__(self, state):
+        self.df, = state
+
+
+    def label (self, prices, type = PriceType.PRICE, scale = 1e4, out = None, workspace = None):
         """
         Perform labeling
 
+        When `out` and / or `workspace` are supplied, the raw label vector is returned instead of a
+        dataframe, and repeated calls on equal-sized (numpy) inputs do no further allocation.  Note that
+        `plot` requires a prior call in dataframe form.
+
         :param prices: vector of bars, prices, or cumulative returns
         :param type: indicates whether in price, cumulative BPS, or cumulative return form
-        :return: labels for the series
+        :param scale: scaling applied to cumulative returns (1e4 for bps)
+        :param out: (optional) preallocated label vector of same length as prices, written in place
+        :param workspace: (optional) workspace providing reusable scratch buffers
+        :return: labels for the series (dataframe, or raw label vector if `out` or `workspace` given)
         """
-        if isinstance(prices, pd.DataFrame):
-            prices = prices.reset_index()
-            times = columnFor (prices, ["time", "date", "Date","Datetime", "stamp"])
-            prices = columnFor (prices, ["Adj Close", "Close", "close", "price"])
-        else:
-            prices = pd.Series(prices)
-            times = np.array(0,prices.shape[0])
+        if out is not None or workspace is not None:
+            return self._label_raw (prices, type, scale, out, workspace)
+
+        import pandas as pd
+        from tseries_patterns.common.utils import columnFor
+
+        with stage ("AmplitudeBasedLabeler.columnFor", len(prices)):
+            if isinstance(prices, pd.DataFrame):
+                prices = prices.reset_index()
+                times = columnFor (prices, ["time", "date", "Date","Datetime", "stamp"])
+                prices = columnFor (prices, ["Adj Close", "Close", "close", "price"])
+            else:
+                prices = pd.Series(prices)
+                times = np.array(0,prices.shape[0])
+
+        with stage ("AmplitudeBasedLabeler.toBps", len(prices)):
+            cumr = type.toBps(prices, scale = scale)
+            cumr = cumr.astype(_precision(cumr.dtype), copy=False)
+            n = cumr.shape[0]
+            labels = np.zeros(n, dtype=cumr.dtype)
 
-        cumr = type.toBps(prices, scale = scale)
-        n = cumr.shape[0]
-        labels = np.zeros(n).astype(np.double)
+        self._run (cumr, labels)
 
-        self._pass1 (cumr, labels)
-        self._filter (cumr, labels)
-        self.df = pd.DataFrame({'stamp': times, 'price': cumr, 'label': labels})
+        with stage ("AmplitudeBasedLabeler.frame", n):
+            self.df = pd.DataFrame({'stamp': times, 'price': cumr, 'label': labels})
         return self.df
 
 
+    def _label_raw (self, prices, type, scale, out, workspace):
+        """
+        Labeling into caller-supplied and / or workspace buffers, returning the raw label vector
+        """
+        with stage ("AmplitudeBasedLabeler.columnFor", len(prices)):
+            if isinstance(prices, np.ndarray):
+                pass
+            elif hasattr(prices, "columns"):
+                from tseries_patterns.common.utils import columnFor
+                prices = columnFor (prices, ["Adj Close", "Close", "close", "price"]).values
+            elif hasattr(prices, "values"):
+                prices = prices.values
+            else:
+                prices = np.asarray(prices)
+
+        n = prices.shape[0]
+        if workspace is None:
+            workspace = Workspace()
+        if out is None:
+            out = workspace.buffer ("labels", n, _precision(prices.dtype))
+        elif out.shape[0] != n:
+            raise Exception (f"output vector length {out.shape[0]} does not match input length {n}")
+        elif out.dtype != np.float32 and out.dtype != np.double:
+            raise Exception (f"output vector must be float32 or float64, got {out.dtype}")
+
+        with stage ("AmplitudeBasedLabeler.toBps", n):
+            cumr = type.toBps (prices, scale = scale, out = workspace.buffer ("cumr", n, out.dtype))
+            out.fill (0.0)
+
+        self._run (cumr, out)
+        return out
+
+
+    cdef _run (self, cumr, labels):
+        """
+        Dispatch labeling passes to the kernel specialization matching the label precision
+        """
+        cdef float[:] cumr_f
+        cdef float[:] labels_f
+        cdef double[:] cumr_d
+        cdef double[:] labels_d
+        cdef int n = labels.shape[0]
+
+        if labels.dtype == np.float32:
+            cumr_f = cumr
+            labels_f = labels
+            with stage ("AmplitudeBasedLabeler._pass1", n):
+                self._pass1 (cumr_f, labels_f)
+            with stage ("AmplitudeBasedLabeler._filter", n):
+                self._filter (cumr_f, labels_f)
+        else:
+            cumr_d = cumr
+            labels_d = labels
+            with stage ("AmplitudeBasedLabeler._pass1", n):
+                self._pass1 (cumr_d, labels_d)
+            with stage ("AmplitudeBasedLabeler._filter", n):
+                self._filter (cumr_d, labels_d)
+
+
     def plot(
         self,
         color_price = 'darkgray',
@@ -119,6 +212,11 @@ cdef class AmplitudeBasedLabeler:
         :param title: title associated with graph
         :return:
         """
+        import pandas as pd
+        import plotnine
+        from plotnine import ggplot, aes, geom_line, geom_point, labs
+        from tseries_patterns.common.rendering import scale_x_datetime_auto
+
         labels = self.df["label"]
         up = (labels > 0.0)
         neutral = (labels == 0.0)
@@ -138,7 +236,7 @@ cdef class AmplitudeBasedLabeler:
         return v
 
 
-    cdef void _pass1 (self, double[:] cumr, double[:] labels):
+    cdef void _pass1 (self, floating[:] cumr, floating[:] labels):
         """
         Brute-force labeling according to minamp and Tinactive rules.  This needs to be further filtered with 
         OLS pass
@@ -160,7 +258,7 @@ cdef class AmplitudeBasedLabeler:
         cdef double Vmax = cumr[0]
         cdef double Vprior = cumr[0]
 
-        cdef v = 0.0
+        cdef double v = 0.0
 
         while Icursor < len:
             v = cumr[Icursor]
@@ -234,7 +332,7 @@ cdef class AmplitudeBasedLabeler:
             self._apply_label (labels, Istart, Icursor-1, 0.0)
 
 
-    cdef void _filter (self, double[:] cumr, double[:] labels):
+    cdef void _filter (self, floating[:] cumr, floating[:] labels):
         """
         Using distance from OLS regression, determine which points in a momentum region belong
         
@@ -354,7 +452,7 @@ cdef class AmplitudeBasedLabeler:
             Ipos = Iend+1
 
 
-    cdef void _apply_label (self, double[:] labels, int Istart, int Iend, double dir):
+    cdef void _apply_label (self, floating[:] labels, int Istart, int Iend, double dir):
         for i in range (Istart, Iend+1):
             labels[i] = dir
 
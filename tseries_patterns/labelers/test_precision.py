@@ -0,0 +1,80 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import unittest
+import numpy as np
+import pandas as pd
+
+from tseries_patterns.labelers import AmplitudeBasedLabeler
+from tseries_patterns.buysell import HawkesBSI, HawkesBVC
+
+
+##
+##  UNIT TESTS: float32 vs float64 evaluation of the compiled labeler and Hawkes estimators
+##
+
+class TestPrecision(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 200000
+        self._prices = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 1e-3, n)))
+        self._bars = pd.DataFrame({
+            'stamp': np.arange(n),
+            'close': self._prices,
+            'buyvolume': rng.poisson(5.0, n) * 100.0,
+            'sellvolume': rng.poisson(5.0, n) * 100.0})
+
+
+    def test_labeler(self):
+        n = len(self._prices)
+        labeler = AmplitudeBasedLabeler (minamp = 20, Tinactive = 10)
+        labels64 = labeler.label (self._prices, out = np.empty(n))
+        labels32 = labeler.label (self._prices.astype(np.float32), out = np.empty(n, dtype=np.float32))
+        frame32 = labeler.label (self._bars[['stamp','close']].astype({'close': np.float32}))
+
+        self.assertEqual (labels64.dtype, np.float64)
+        self.assertEqual (labels32.dtype, np.float32)
+        self.assertEqual (frame32['label'].dtype, np.float32)
+
+        ## labels differ only at move boundaries within float32 rounding of minamp (measured 0 - 6e-5 over seeds)
+        self.assertLessEqual (np.mean(labels64 != labels32), 1e-4)
+
+
+    def test_hawkes(self):
+        bars32 = self._bars.astype({'close': np.float32, 'buyvolume': np.float32, 'sellvolume': np.float32})
+
+        for estimator, column, tolerance in [(HawkesBSI(0.1), 'bsi', 1e-6), (HawkesBVC(10, 0.1), 'bvc', 1e-4)]:
+            v64 = estimator.eval (self._bars)[column].values
+            v32 = estimator.eval (bars32)[column].values
+
+            self.assertEqual (v64.dtype, np.float64)
+            self.assertEqual (v32.dtype, np.float32)
+            self.assertLessEqual (np.max(np.abs(v64 - v32)) / np.max(np.abs(v64)), tolerance)
+
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,216 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import unittest
+import numpy as np
+import pandas as pd
+
+from tseries_patterns.math.distributions.EmpiricalDistribution1D import EmpiricalDistribution1D
+
+
+class DecayingEmpiricalDistribution1D (EmpiricalDistribution1D):
+    """
+    Empirical distribution with exponential forgetting: the weight of an event halves with every `halflife`
+    subsequent events.
+
+    Rather than decaying all bins on each event, each new event is weighted by a growing factor 2^(t / halflife),
+    which is equivalent once normalized (all queries are relative to the total mass).  The mass is renormalized
+    (an O(bins) pass) only when the factor becomes large, so updates remain O(1) and memory is fixed by the bins.
+    """
+
+    # growth factor at which mass is renormalized
+    RENORMALIZE = 1e100
+
+    def __init__(self, xdomain: list, xbins = 100, halflife: float = 1000):
+        """
+        :param xdomain: domain [xmin, xmax]
+        :param xbins: number of bins
+        :param halflife: number of events over which the weight of an event halves
+        """
+        super().__init__(xdomain, xbins)
+        if halflife <= 0:
+            raise Exception ("halflife must be positive, got %s" % halflife)
+
+        self.halflife = halflife
+        self._growth = 1.0
+
+
+    def addEvent (self, x: float, p = 1.0):
+        """
+        Add event / sample to distribution, decaying prior events
+        """
+        self._advance (1)
+        super().addEvent (x, p * self._growth)
+
+
+    def addEventList (self, xlist, p = 1.0):
+        """
+        Add list of events to distribution in order, decaying prior events
+        """
+        x = np.asarray(xlist, dtype=float).reshape(-1)
+        p = np.broadcast_to(np.asarray(p, dtype=float), x.shape)
+
+        # segments sized such that the growth factor cannot overflow within a segment
+        step = int(max(1, min(EmpiricalDistribution1D.CHUNK, self.halflife * 300)))
+        for Istart in range(0, x.shape[0], step):
+            Iend = min(x.shape[0], Istart + step)
+            growth = self._growth * np.exp2(np.arange(1, Iend - Istart + 1) / self.halflife)
+            super().addEventList (x[Istart:Iend], p[Istart:Iend] * growth)
+            self._advance (Iend - Istart)
+
+
+    def addEventRange (self, x0: float, x1: float, p = 1.0):
+        """
+        Add event to distribution across a range (see EmpiricalDistribution1D.addEventRange), decaying prior
+        events once for the range as a whole
+        """
+        self._advance (1)
+        super().addEventRange (x0, x1, p * self._growth)
+
+
+    def reset (self):
+        """
+        Clear distribution
+        """
+        super().reset()
+        self._growth = 1.0
+
+
+    def f(self, x: float):
+        """
+        determine the (decayed) mass at x
+        """
+        return super().f(x) / self._growth
+
+
+    def toSeries(self):
+        """
+        Provide (decayed) distribution as series
+        """
+        df = super().toSeries()
+        df['density'] = df['density'] / self._growth
+        return df
+
+
+    def merge (self, other, weight: float = 1.0):
+        """
+        Merge another distribution, taking the weights of each distribution's latest events as equal.  To merge
+        consecutive partial distributions, weight the earlier one by its decay over the later one's events.
+        """
+        self._renormalize()
+        return super().merge (other, weight)
+
+
+    def toBytes (self) -> bytes:
+        """
+        Compact serialization of the current (decayed) distribution (see EmpiricalDistribution1D.toBytes)
+        """
+        self._renormalize()
+        return super().toBytes()
+
+
+    @property
+    def weight (self) -> float:
+        """
+        Total decayed weight of the events seen (the effective number of events, for unit weights)
+        """
+        return self._scale / self._growth
+
+
+    #
+    #   Implementation
+    #
+
+    def _advance (self, n: int):
+        """
+        Advance time by n events, such that the growth factor is the weight of the latest event
+        """
+        self._growth *= 2.0 ** (n / self.halflife)
+        if self._growth > DecayingEmpiricalDistribution1D.RENORMALIZE:
+            self._renormalize()
+
+
+    def _renormalize (self):
+        """
+        Fold growth factor into the mass, such that the most recent event has weight ~1
+        """
+        g = self._growth
+        self._mass /= g
+        self._scale /= g
+        self._wsum /= g
+        self._growth = 1.0
+        self._invalidate()
+
+
+
+##
+##  UNIT TESTS
+##
+
+class TestDecayingDistribution(unittest.TestCase):
+
+    def test_decay(self):
+        dist = DecayingEmpiricalDistribution1D ([-10,10], 201, halflife=100)
+
+        ## old regime forgotten in favour of new
+        dist.addEventList (np.full(1000, -5.0))
+        dist.addEventList (np.full(1000, 5.0))
+        self.assertAlmostEqual (5.0, dist.median(), delta=0.1)
+
+        ## weight of events seen converges to sum of geometric series
+        self.assertAlmostEqual (1 / (1 - 2**(-1/100)), dist.weight, delta=0.01)
+
+
+    def test_range(self):
+        dist = DecayingEmpiricalDistribution1D ([-3,3], 61, halflife=1)
+        dist.addEvent (2.0)
+        dist.addEventRange (-1.0, 1.0)
+
+        self.assertAlmostEqual (dist.weight, 21 + 0.5)
+        self.assertAlmostEqual (dist.f(0.0), 1.0)
+
+
+    def test_renormalize(self):
+        events = np.random.default_rng(1).normal(size=5000)
+
+        ## small half-life forces many renormalizations, matching explicitly decayed weights
+        dist = DecayingEmpiricalDistribution1D ([-4,4], 81, halflife=7)
+        for x in events:
+            dist.addEvent (x)
+
+        weights = 2.0 ** (-(len(events) - 1 - np.arange(len(events))) / 7)
+        direct = EmpiricalDistribution1D ([-4,4], 81)
+        direct.addEventList (events, weights)
+
+        self.assertAlmostEqual (direct.mean(), dist.mean())
+        self.assertAlmostEqual (direct.icum(0.3), dist.icum(0.3))
+
+        bulk = DecayingEmpiricalDistribution1D ([-4,4], 81, halflife=7)
+        bulk.addEventList (events)
+        self.assertAlmostEqual (dist.mean(), bulk.mean())
+
+
+if __name__ == '__main__':
+
+    unittest.main()
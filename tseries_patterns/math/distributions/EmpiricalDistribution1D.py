@@ -23,12 +23,14 @@
 #
 
 
+import copy
 import random
+import struct
 import unittest
 import numpy as np
 import pandas as pd
 
-from tseries_patterns.common.utils import constrain, frange, cbind
+from tseries_patterns.common.utils import constrain, cbind
 
 
 class EmpiricalDistribution1D:
@@ -39,6 +41,16 @@ class EmpiricalDistribution1D:
     2. number of bins
     """
 
+    # number of events processed at a time in bulk insertion
+    CHUNK = 1 << 20
+
+    # minimum log density yielded by logf (where there is no mass)
+    LOGF_FLOOR = -30.0
+
+    # serialization header: magic, xmin, xmax, bins, scale, wsum, ileft, iright
+    _HEADER = "<4sddqddqq"
+    _MAGIC = b"ED1D"
+
     def __init__(self, xdomain: list, xbins = 100):
 
         self._domain = xdomain
@@ -49,6 +61,7 @@ class EmpiricalDistribution1D:
         self._ileft = xbins
         self._wsum = 0.0
         self._scale = 0.0
+        self._invalidate()
 
 
     def median (self):
@@ -74,20 +87,22 @@ class EmpiricalDistribution1D:
         return pd.DataFrame (cbind(x,y), columns=['x','density'])
 
 
-    def observations (self, n = 1000):
+    def observations (self, n = 1000, counts: bool = False):
         """
-        Provide a list of faked observations
-        """
-        observations = []
-        scale = n / self._scale
+        Provide faked observations: each bin center repeated in proportion to its mass, for ~n observations
 
-        x = self._domain[0]
-        for i in range(self._xbins):
-            n = int(self._mass[i] * scale)
-            observations += [x] * n
-            x += self._dx
+        :param n: (approximate) number of observations
+        :param counts: return (bin centers, counts) for occupied bins rather than the repeated observations
+        :return: vector of observations, or tuple of values and counts
+        """
+        x = self._domain[0] + np.arange(self._xbins) * self._dx
+        k = (np.asarray(self._mass, dtype=float) * (n / self._scale)).astype(np.int64)
 
-        return observations
+        if counts:
+            occupied = k > 0
+            return x[occupied], k[occupied]
+        else:
+            return np.repeat(x, k)
 
 
     def addEvent (self, x: float, p = 1.0):
@@ -111,21 +126,35 @@ class EmpiricalDistribution1D:
 
     def addEventList (self, xlist, p = 1.0):
         """
-        Add list of events to distribution
+        Add list of events to distribution.  The bins and aliasing weights of all events are computed as vectors
+        and accumulated in event order, matching repeated addEvent() exactly.
+
+        :param xlist: list or vector of events
+        :param p: weight of all events or vector of weights, one per event
         """
-        for x in xlist:
-            self.addEvent(x, p)
+        x = np.asarray(xlist, dtype=float).reshape(-1)
+        p = np.broadcast_to(np.asarray(p, dtype=float), x.shape)
+        self._add_events (x, p)
 
 
     def addEventRange (self, x0: float, x1: float, p = 1.0):
         """
-        Add event to distribution across a range
+        Add event to distribution across a range: mass p at each step of one bin width from x0 through x1
+        (as frange), added to the covered bins in one pass
+
+        :param x0: start of range
+        :param x1: end of range (inclusive)
+        :param p: mass at each step
         """
         x0 = constrain(x0, self._domain[0], self._domain[1])
         x1 = constrain(x1, self._domain[0], self._domain[1])
 
-        for x in frange(x0, x1, self._dx):
-            self.addEvent (x0, p = p)
+        eps = self._dx / 100
+        if x1 - x0 <= -eps:
+            return
+
+        x = x0 + np.arange(int((x1 - x0 + eps) // self._dx) + 1) * self._dx
+        self._add_events (x, np.broadcast_to(float(p), x.shape))
 
 
     def reset (self):
@@ -140,6 +169,8 @@ class EmpiricalDistribution1D:
         for i in range(0, self._xbins):
             self._mass[i] = 0.0
 
+        self._invalidate()
+
 
     def f(self, x: float):
         """
@@ -153,77 +184,212 @@ class EmpiricalDistribution1D:
         aliasing = (rx - ix - 0.5)
 
         if aliasing >= 0:
-            return self._mass[ix] * aliasing + self._mass[ix+1] * (1 - aliasing)
+            return self._mass[ix] * (1 - aliasing) + self._mass[min(ix+1, self._xbins-1)] * aliasing
         else:
             return self._mass[ix] * (1+aliasing) + self._mass[ix-1] * -aliasing
 
 
-    def cum(self, x0: float, x1 = None):
+    def logf(self, x, floor: float = LOGF_FLOOR):
         """
-        determine cumulative probability between x0 and x1 or start of distribution to x
+        Log density function, vectorized: the log of the normalized density at each x, interpolated linearly
+        between bin centers (as f).  Can be used directly as an HMM emission distribution: the log density is
+        floored, such that an observation in a region without mass (or outside of the domain) for every state
+        does not yield an impossible emission.
+
+        :param x: value on domain or an array of values
+        :param floor: minimum log density, or None for the unfloored log density (-inf where there is no mass)
+        :return: log density of same shape as x
+        """
+        density = self._densitytable()
+        xv = np.asarray(x, dtype=float)
+        flat = xv.reshape(-1)
+
+        rx = (flat - self._domain[0]) / self._dx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logp = np.log(np.interp(rx, np.arange(self._xbins), density, left=0.0, right=0.0))
+        logp[np.isnan(flat)] = -np.inf
+
+        if floor is not None:
+            np.maximum(logp, floor, out=logp)
+        return logp.reshape(xv.shape) if xv.ndim > 0 else float(logp[0])
+
+
+    def cum(self, x0, x1 = None):
+        """
+        determine cumulative probability between x0 and x1 or start of distribution to x (vectorized over
+        arrays of x0 and / or x1, answered from the cached cumulative mass)
         """
         xstart = self._domain[0]
         xend = self._domain[1]
 
-        if x1 == None:
-            x1 = constrain(x0, xstart, xend)
+        if x1 is None:
+            x1 = np.clip(x0, xstart, xend)
             x0 = xstart
         else:
-            x0 = constrain(x0, xstart, xend)
-            x1 = constrain(x1, xstart, xend)
+            x0 = np.clip(x0, xstart, xend)
+            x1 = np.clip(x1, xstart, xend)
 
-        Srx = (x0 - xstart) / self._dx + 0.5
-        Erx = (x1 - xstart) / self._dx + 0.5
+        Srx = (np.asarray(x0, dtype=float) - xstart) / self._dx + 0.5
+        Erx = (np.asarray(x1, dtype=float) - xstart) / self._dx + 0.5
 
-        Si = int(Srx)
-        Ei = int(Erx)
+        Si = Srx.astype(np.intp)
+        Ei = Erx.astype(np.intp)
+        mass = np.asarray(self._mass, dtype=float)
+        C = self._cumulative()
 
         ## main mass area
-        cum = np.sum(self._mass[(Si+1):Ei])
+        cum = np.where(Ei > Si + 1, C[np.maximum(Ei, Si + 1)] - C[np.minimum(Si + 1, self._xbins)], 0.0)
 
         ## left boundary
         Laliasing = Srx - Si
-        cum += ((self._mass [Si] * (1 - Laliasing)) if (Si > 0) else self._mass [Si])
+        cum = cum + np.where(Si > 0, mass[Si] * (1 - Laliasing), mass[Si])
 
         ## right boundary
         Raliasing = (Erx - Ei)
-        cum += self._mass [Ei] * (1 - Raliasing)
+        cum = cum + mass[Ei] * (1 - Raliasing)
 
-        return cum / self._scale
+        cum = cum / self._scale
+        return cum if cum.ndim > 0 else float(cum)
 
 
-    def icum(self, p: float):
+    def icum(self, p):
         """
-        Inverse cumulative function, finds x, such that f(x) = p
+        Inverse cumulative function, finds x, such that f(x) = p (vectorized over an array of p, answered by
+        binary search on the cached cumulative mass)
         """
         if self._iright < 0:
             raise Exception ("cannot compute inverse cumulative without samples")
 
         ## convert probability into mass
-        mass = p * self._scale
+        mass = np.asarray(p, dtype=float) * self._scale
 
         ## determine cumulative probability >= target
-        cc = np.cumsum(self._mass)
-        indices, = np.where (cc >= mass)
-        Ci = indices[0] if len(indices) > 0 else self._iright
+        cc = self._cumulative()[1:]
+        Ci = np.searchsorted(cc, mass, side='left')
+        Ci = np.where(Ci < cc.shape[0], Ci, self._iright)
         Pi = Ci - 1
 
         Csum = cc[Ci]
-        Psum = cc[Pi] if Pi >= 0 else 0.0
+        Psum = np.where(Pi >= 0, cc[np.maximum(Pi, 0)], 0.0)
 
         xstart = self._domain[0]
         dx = self._dx
-        Px = xstart + float(Pi) * dx + dx / 2
+        Px = xstart + Pi.astype(float) * dx + dx / 2
+
+        x = Px + (mass - Psum) / (Csum - Psum) * dx
+        return x if x.ndim > 0 else float(x)
+
+
+    def sample (self, n: int = None, rng = None, method: str = "icum"):
+        """
+        Get a random sample (or n samples) from this distribution
+
+        :param n: number of samples, or None for a single sample
+        :param rng: numpy Generator or seed (default: fresh generator; a single sample without rng draws from `random`)
+        :param method: "icum" (inverse cumulative of a uniform draw) or "alias" (Walker alias method: O(1) draw
+               of a bin, then uniform within the bin); both sample the same piecewise-uniform density
+        :return: sample, or vector of n samples
+        """
+        if n is None and rng is None and method == "icum":
+            r = random.uniform(0,1)
+            return self.icum(r)
+
+        rng = np.random.default_rng(rng)
+        size = 1 if n is None else n
+        samples = np.empty(size)
 
-        return Px + (mass - Psum) / (Csum - Psum) * dx
+        for Istart in range(0, size, EmpiricalDistribution1D.CHUNK):
+            Iend = min(size, Istart + EmpiricalDistribution1D.CHUNK)
+            if method == "icum":
+                samples[Istart:Iend] = self.icum(rng.random(Iend - Istart))
+            elif method == "alias":
+                samples[Istart:Iend] = self._sample_alias(rng, Iend - Istart)
+            else:
+                raise Exception ("unknown sampling method: %s" % method)
 
+        return samples if n is not None else float(samples[0])
 
-    def sample (self):
+
+    def merge (self, other, weight: float = 1.0):
+        """
+        Merge another distribution into this one (such as partial distributions built in parallel).  Where the
+        domain and bins agree the masses are added directly; otherwise the other distribution's domain must lie
+        within ours and each of its bins is re-binned (with the same aliasing as addEvent).
+
+        :param other: distribution to merge (a decaying distribution is merged with its latest event at weight 1)
+        :param weight: weight applied to the other distribution's mass
+        :return: self
+        """
+        if other._iright < 0:
+            return self
+
+        # mass of a decaying distribution is held scaled by its growth factor
+        weight = weight / getattr(other, "_growth", 1.0)
+
+        mass = np.asarray(other._mass, dtype=float) * weight
+        if list(other._domain) == list(self._domain) and other._xbins == self._xbins:
+            self._mass += mass
+            self._scale += other._scale * weight
+            self._iright = max(self._iright, other._iright)
+            self._ileft = min(self._ileft, other._ileft)
+            self._invalidate()
+
+        elif other._domain[0] >= self._domain[0] and other._domain[1] <= self._domain[1]:
+            x = np.linspace(other._domain[0], other._domain[1], other._xbins)
+            nonzero = mass != 0
+            _, bins, weights = self._binweights (x[nonzero], mass[nonzero])
+            self._add_masses (bins, weights)
+
+        else:
+            raise Exception ("cannot merge distribution on domain %s into domain %s" % (other._domain, self._domain))
+
+        self._wsum += other._wsum * weight
+        return self
+
+
+    def __iadd__ (self, other):
+        return self.merge (other)
+
+    def __add__ (self, other):
+        return copy.deepcopy(self).merge (other)
+
+
+    def toBytes (self) -> bytes:
         """
-        Get a random sample from this distribution
+        Compact serialization: domain, bins, totals, and the mass of the occupied bins only
         """
-        r = random.uniform(0,1)
-        return self.icum(r)
+        ileft = max(0, self._ileft)
+        iright = self._iright
+        mass = np.asarray(self._mass[ileft:iright+1] if iright >= 0 else [], dtype='<f8')
+
+        header = struct.pack (
+            EmpiricalDistribution1D._HEADER, EmpiricalDistribution1D._MAGIC,
+            float(self._domain[0]), float(self._domain[1]), self._xbins,
+            float(self._scale), float(self._wsum), self._ileft, self._iright)
+        return header + mass.tobytes()
+
+
+    @staticmethod
+    def fromBytes (data: bytes):
+        """
+        Create distribution from serialized form (see toBytes)
+
+        :param data: bytes from toBytes()
+        :return: distribution
+        """
+        size = struct.calcsize(EmpiricalDistribution1D._HEADER)
+        magic, xmin, xmax, xbins, scale, wsum, ileft, iright = struct.unpack (EmpiricalDistribution1D._HEADER, data[:size])
+        if magic != EmpiricalDistribution1D._MAGIC:
+            raise Exception ("not a serialized distribution")
+
+        dist = EmpiricalDistribution1D ([xmin, xmax], xbins)
+        if iright >= 0:
+            dist._mass[max(0, ileft):iright+1] = np.frombuffer(data, dtype='<f8', offset=size)
+        dist._scale = scale
+        dist._wsum = wsum
+        dist._ileft = ileft
+        dist._iright = iright
+        return dist
 
 
     @staticmethod
@@ -240,11 +406,12 @@ class EmpiricalDistribution1D:
         x = np.linspace(xmin, xmax, xbins)
 
         dist = EmpiricalDistribution1D ([xmin, xmax], xbins)
-        dist._mass = bins
+        dist._mass = np.asarray(bins, dtype=float)
         dist._scale = np.sum(bins)
         dist._wsum = np.average(x, weights=dist._mass) * dist._scale
         dist._ileft = 0
         dist._iright = xbins-1
+        dist._invalidate()
         return dist
 
 
@@ -252,10 +419,126 @@ class EmpiricalDistribution1D:
     #   Implementation
     #
 
+    def _invalidate (self):
+        """
+        Drop tables derived from the mass (called on any change to the mass)
+        """
+        self._density = None
+        self._cummass = None
+        self._alias = None
+
+
+    def _add_events (self, x: np.ndarray, p: np.ndarray):
+        """
+        Add vector of events with vector of weights, in chunks
+        """
+        for Istart in range(0, x.shape[0], EmpiricalDistribution1D.CHUNK):
+            Iend = Istart + EmpiricalDistribution1D.CHUNK
+            xc, bins, weights = self._binweights (x[Istart:Iend], p[Istart:Iend])
+            self._add_masses (bins, weights)
+            self._wsum = _sequential_sum (self._wsum, xc * p[Istart:Iend])
+
+
+    def _sample_alias (self, rng, n: int) -> np.ndarray:
+        prob, alias = self._aliastable()
+        bins = rng.integers(0, self._xbins, size=n)
+        bins = np.where(rng.random(n) < prob[bins], bins, alias[bins])
+        return self._domain[0] + (bins + rng.random(n) - 0.5) * self._dx
+
+
+    def _aliastable (self):
+        """
+        Walker / Vose alias table over bins: bin i is drawn by picking i uniformly, then keeping it with
+        probability prob[i] or taking alias[i] otherwise
+        """
+        if self._alias is None:
+            if self._iright < 0:
+                raise Exception ("cannot sample without samples")
+
+            K = self._xbins
+            scaled = np.asarray(self._mass, dtype=float) * (K / self._scale)
+            prob = np.ones(K)
+            alias = np.arange(K)
+
+            small = list(np.where(scaled < 1.0)[0])
+            large = list(np.where(scaled >= 1.0)[0])
+            while small and large:
+                s = small.pop()
+                l = large[-1]
+                prob[s] = scaled[s]
+                alias[s] = l
+                scaled[l] -= 1.0 - scaled[s]
+                if scaled[l] < 1.0:
+                    large.pop()
+                    small.append(l)
+
+            self._alias = (prob, alias)
+        return self._alias
+
+
+    def _cumulative (self):
+        """
+        Cumulative mass, with a leading 0 (so that C[j] - C[i] is the mass of bins [i, j))
+        """
+        if self._cummass is None:
+            self._cummass = np.concatenate (([0.0], np.cumsum(self._mass)))
+        return self._cummass
+
+
+    def _densitytable (self):
+        """
+        Normalized density at each bin center
+        """
+        if self._density is None:
+            if self._scale <= 0:
+                raise Exception ("cannot compute density without samples")
+            self._density = np.asarray(self._mass, dtype=float) / (self._scale * self._dx)
+        return self._density
+
+
+    def _binweights (self, x: np.ndarray, p: np.ndarray):
+        """
+        Bins and linear-aliasing weights of a vector of events (as addEvent)
+
+        :return: tuple of constrained events, and interleaved bins and weights (two per event, in addEvent order)
+        """
+        x = np.clip(x, self._domain[0], self._domain[1])
+        rx = (x - self._domain[0]) / self._dx + 0.5
+        ix = rx.astype(np.intp)
+        aliasing = rx - ix - 0.5
+
+        up = aliasing >= 0
+        bins = np.empty((x.shape[0], 2), dtype=np.intp)
+        bins[:,0] = ix
+        bins[:,1] = np.where(up, ix + 1, ix - 1)
+
+        weights = np.empty((x.shape[0], 2))
+        weights[:,0] = np.where(up, 1 - aliasing, 1 + aliasing) * p
+        weights[:,1] = np.where(up, aliasing, -aliasing) * p
+
+        np.clip(bins, 0, self._xbins-1, out=bins)
+        return x, bins.reshape(-1), weights.reshape(-1)
+
+
+    def _add_masses (self, bins: np.ndarray, weights: np.ndarray):
+        """
+        Add masses to bins in order (as repeated __add_mass)
+        """
+        if bins.shape[0] == 0:
+            return
+
+        np.add.at (self._mass, bins, weights)
+        self._scale = _sequential_sum (self._scale, weights)
+        self._iright = max(self._iright, int(bins.max()))
+        self._ileft = min(self._ileft, int(bins.min()))
+        self._invalidate()
+
+
     def __add_mass (self, x: int, mass: float):
         x = constrain (x, 0, self._xbins-1)
         self._scale += mass
         self._mass[x] += mass
+        self._invalidate()
 
         if x > self._iright:
             self._iright = x
@@ -264,6 +547,15 @@ class EmpiricalDistribution1D:
 
 
 
+def _sequential_sum (start: float, values: np.ndarray) -> float:
+    """
+    Sum accumulated left to right from start (as a loop of +=), rather than pairwise
+    """
+    if values.shape[0] == 0:
+        return start
+    acc = np.cumsum(np.concatenate(([start], values)))
+    return float(acc[-1])
+
 
 ##
 ##  UNIT TESTS
@@ -308,6 +600,147 @@ class TestHistogramDistribution(unittest.TestCase):
         #self.assertAlmostEqual (-0.1276642, dist.median())
 
 
+    def test_addEventList(self):
+        # same distribution built one event at a time and in bulk
+        events = np.concatenate ((self._events, [-3.5, -3.0, 0.0, 3.0, 4.0])) * 1.7
+        weights = np.linspace(0.5, 2.0, len(events))
+
+        dist1 = EmpiricalDistribution1D ([-3,3], 100)
+        for x, p in zip(events, weights):
+            dist1.addEvent (x, p)
+
+        dist2 = EmpiricalDistribution1D ([-3,3], 100)
+        dist2.addEventList (events, weights)
+
+        self.assertTrue (np.array_equal (dist1._mass, dist2._mass))
+        self.assertEqual (dist1._scale, dist2._scale)
+        self.assertEqual (dist1._wsum, dist2._wsum)
+        self.assertEqual ((dist1._ileft, dist1._iright), (dist2._ileft, dist2._iright))
+
+
+    def test_vectorized_queries(self):
+        dist = EmpiricalDistribution1D ([-3,3], 100)
+        dist.addEventList (self._events)
+
+        ## quantile grid matches scalar queries
+        p = np.linspace(0.05, 0.95, 19)
+        x = dist.icum(p)
+        for pi, xi in zip(p, x):
+            self.assertEqual (dist.icum(pi), xi)
+
+        ## cumulative over a grid matches scalar queries, and follows new events
+        c = dist.cum(x)
+        for xi, ci in zip(x, c):
+            self.assertAlmostEqual (dist.cum(float(xi)), ci)
+        before = dist.cum(0.0)
+        dist.addEvent (-1.0, p=10)
+        self.assertGreater (dist.cum(0.0), before)
+
+
+    def test_sample(self):
+        dist = EmpiricalDistribution1D ([-3,3], 61)
+        dist.addEventList (self._events)
+        mean = np.mean(self._events)
+
+        ## both methods sample the binned density
+        for method in ["icum", "alias"]:
+            x = dist.sample (100000, rng=1, method=method)
+            self.assertEqual ((100000,), x.shape)
+            self.assertAlmostEqual (mean, np.mean(x), delta=0.02)
+            self.assertAlmostEqual (0.5, np.mean(x <= dist.median()), delta=0.01)
+
+        ## reproducible given seed
+        self.assertTrue (np.array_equal (dist.sample(10, rng=7), dist.sample(10, rng=7)))
+
+
+    def test_range_observations(self):
+        dist = EmpiricalDistribution1D ([-3,3], 61)
+        dist.addEventRange (-1.0, 1.0)
+
+        expected = EmpiricalDistribution1D ([-3,3], 61)
+        for x in np.linspace(-1.0, 1.0, 21):
+            expected.addEvent (x)
+
+        self.assertTrue (np.allclose (dist._mass, expected._mass))
+        self.assertAlmostEqual (dist.mean(), 0.0)
+        self.assertAlmostEqual (dist._scale, 21)
+
+        values, counts = dist.observations (2100, counts=True)
+        self.assertEqual (len(values), 21)
+        self.assertEqual (counts.sum(), len(dist.observations (2100)))
+
+
+    def test_merge(self):
+        events = np.array(self._events)
+
+        ## merging halves yields whole
+        whole = EmpiricalDistribution1D ([-3,3], 100)
+        whole.addEventList (events)
+        part1 = EmpiricalDistribution1D ([-3,3], 100)
+        part1.addEventList (events[:50])
+        part2 = EmpiricalDistribution1D ([-3,3], 100)
+        part2.addEventList (events[50:])
+        part1 += part2
+
+        self.assertTrue (np.allclose (whole._mass, part1._mass))
+        self.assertAlmostEqual (whole.mean(), part1.mean())
+        self.assertAlmostEqual (whole.median(), part1.median())
+
+        ## rebinning merge into wider domain preserves totals
+        wide = EmpiricalDistribution1D ([-5,5], 51)
+        wide.merge (whole)
+        self.assertAlmostEqual (whole._scale, wide._scale)
+        self.assertAlmostEqual (whole.mean(), wide.mean())
+        self.assertRaises (Exception, whole.merge, wide)
+
+        ## decaying distribution merged with its latest event at weight 1
+        from tseries_patterns.math.distributions import DecayingEmpiricalDistribution1D
+        decaying = DecayingEmpiricalDistribution1D ([-3,3], 100, halflife=1e9)
+        decaying.addEventList (events)
+        plain = EmpiricalDistribution1D ([-3,3], 100)
+        plain.merge (decaying)
+        self.assertTrue (np.allclose (whole._mass, plain._mass))
+        self.assertAlmostEqual (whole.mean(), plain.mean())
+
+        ## serialization round trip
+        copy = EmpiricalDistribution1D.fromBytes (whole.toBytes())
+        self.assertTrue (np.array_equal (whole._mass, copy._mass))
+        self.assertEqual (whole.icum(0.3), copy.icum(0.3))
+
+
+    def test_logf(self):
+        # setup distribution
+        dist = EmpiricalDistribution1D ([-3,3], 61)
+        dist.addEventList (self._events)
+
+        ## density integrates to 1 over the bins
+        x = np.linspace(-3, 3, 61)
+        self.assertAlmostEqual (1.0, np.sum(np.exp(dist.logf(x))) * 0.1)
+
+        ## vectorized over shape, matching scalar evaluation
+        X = np.array(self._events).reshape(-1, 1)
+        logp = dist.logf(X)
+        self.assertEqual (X.shape, logp.shape)
+        self.assertAlmostEqual (dist.logf(self._events[0]), logp[0,0])
+
+        ## interpolated as f
+        x = np.random.default_rng(1).uniform(-3, 3, 100)
+        f = np.array([dist.f(v) for v in x]) / (dist._scale * dist._dx)
+        self.assertTrue (np.allclose (np.exp(dist.logf(x, floor=None)), f))
+
+        ## floored outside of the domain and where there is no mass
+        self.assertEqual (-np.inf, dist.logf(3.5, floor=None))
+        self.assertEqual (EmpiricalDistribution1D.LOGF_FLOOR, dist.logf(3.5))
+        empty = EmpiricalDistribution1D ([-3,3], 61)
+        empty.addEvent (-2.0)
+        self.assertEqual (EmpiricalDistribution1D.LOGF_FLOOR, empty.logf(2.0))
+
+        ## table follows new events
+        before = dist.logf(2.9)
+        dist.addEvent (2.9, p=10)
+        self.assertGreater (dist.logf(2.9), before)
+
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -55,6 +55,23 @@ class ExponentialDistribution:
         return np.log(self.decay) - self.decay * dx
 
 
+    def fit(self, x, weights = None):
+        """
+        Weighted maximum-likelihood estimate of the decay (the M-step of EM), holding base and direction fixed
+
+        :param x: vector of observations
+        :param weights: (optional) weight of each observation
+        :return: self
+        """
+        x = np.asarray(x, dtype=float)
+        w = np.ones(x.shape[0]) if weights is None else np.asarray(weights, dtype=float)
+        W = w.sum()
+        dx = np.dot(w, self.dir * (x - self.base))
+        if W > 0 and dx > 0:
+            self.decay = float(W / dx)
+        return self
+
+
     def cum(self, x0: float, x1: float):
         """
         cumulative density function
@@ -0,0 +1,283 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import unittest
+import numpy as np
+import pandas as pd
+
+from tseries_patterns.math.distributions.EmpiricalDistribution1D import EmpiricalDistribution1D
+
+
+class GroupedEmpiricalDistribution1D:
+    """
+    Empirical distributions on a common domain, one per class (such as returns conditional on the
+    AmplitudeBasedLabeler label):
+
+    1. mass is accumulated into a single (classes x bins) matrix, in one bincount pass per list of events
+    2. each class is exposed as an EmpiricalDistribution1D whose mass is a row view of the matrix (no copies)
+    """
+
+    def __init__(self, xdomain: list, xbins = 100, classes = (-1, 0, 1)):
+        """
+        :param xdomain: domain [xmin, xmax] of all distributions
+        :param xbins: number of bins
+        :param classes: class labels, one distribution per label
+        """
+        self._domain = xdomain
+        self._xbins = xbins
+        self._classes = np.asarray(classes)
+        self._sorter = np.argsort(self._classes, kind='stable')
+        ordered = self._classes[self._sorter]
+        self._consecutive = bool(
+            np.issubdtype(ordered.dtype, np.integer) and np.array_equal(ordered, np.arange(ordered[0], ordered[0] + len(ordered))))
+        self._mass = np.zeros((len(self._classes), xbins), dtype=float)
+
+        self._distributions = []
+        for i in range(len(self._classes)):
+            dist = EmpiricalDistribution1D (xdomain, xbins)
+            dist._mass = self._mass[i]
+            self._distributions.append (dist)
+
+
+    def __getitem__ (self, label) -> EmpiricalDistribution1D:
+        """
+        Distribution of the given class (shares its mass with this object)
+        """
+        return self._distributions[int(self._index([label])[0])]
+
+
+    def __len__ (self):
+        return len(self._classes)
+
+
+    @property
+    def classes (self) -> np.ndarray:
+        """
+        Class labels
+        """
+        return self._classes
+
+
+    @property
+    def distributions (self) -> dict:
+        """
+        Distributions by class label
+        """
+        return dict(zip(self._classes.tolist(), self._distributions))
+
+
+    @property
+    def mass (self) -> np.ndarray:
+        """
+        Mass matrix (classes x bins)
+        """
+        return self._mass
+
+
+    def toSeries(self):
+        """
+        Provide distributions as a frame of x and one density column per class
+        """
+        x = np.linspace(self._domain[0], self._domain[1], self._xbins)
+        df = pd.DataFrame ({'x': x})
+        for label, mass in zip(self._classes.tolist(), self._mass):
+            df[label] = mass
+        return df
+
+
+    def addEvent (self, x: float, label, p = 1.0):
+        """
+        Add event / sample to the distribution of the given class
+        """
+        self[label].addEvent (x, p = p)
+
+
+    def addEventList (self, xlist, labels, p = 1.0):
+        """
+        Add list of events to the distributions of their respective classes
+
+        :param xlist: list or vector of events
+        :param labels: class label of each event
+        :param p: weight of all events or vector of weights, one per event
+        """
+        x = np.asarray(xlist, dtype=float).reshape(-1)
+        p = np.broadcast_to(np.asarray(p, dtype=float), x.shape)
+        classes = self._index(labels)
+        if classes.shape[0] != x.shape[0]:
+            raise Exception ("events and labels must be of the same length")
+
+        K = len(self._classes)
+        template = self._distributions[0]
+
+        for Istart in range(0, x.shape[0], EmpiricalDistribution1D.CHUNK):
+            Iend = Istart + EmpiricalDistribution1D.CHUNK
+            xc, bins, weights = template._binweights (x[Istart:Iend], p[Istart:Iend])
+            c = classes[Istart:Iend]
+            cc = np.repeat(c, 2)
+
+            self._mass += np.bincount(cc * self._xbins + bins, weights=weights, minlength=K * self._xbins).reshape(K, self._xbins)
+            scale = np.bincount(cc, weights=weights, minlength=K)
+            wsum = np.bincount(c, weights=xc * p[Istart:Iend], minlength=K)
+            events = np.bincount(c, minlength=K)
+
+            ileft = np.full(K, self._xbins)
+            iright = np.full(K, -1)
+            np.minimum.at (ileft, cc, bins)
+            np.maximum.at (iright, cc, bins)
+
+            for i in np.flatnonzero(events):
+                dist = self._distributions[i]
+                dist._scale += scale[i]
+                dist._wsum += wsum[i]
+                dist._ileft = min(dist._ileft, int(ileft[i]))
+                dist._iright = max(dist._iright, int(iright[i]))
+                dist._invalidate()
+
+
+    def merge (self, other, weight: float = 1.0):
+        """
+        Merge another grouped distribution with the same domain, bins, and classes into this one
+
+        :param other: grouped distribution to merge
+        :param weight: weight applied to the other distribution's mass
+        :return: self
+        """
+        if list(other._domain) != list(self._domain) or other._xbins != self._xbins or not np.array_equal(other._classes, self._classes):
+            raise Exception ("cannot merge grouped distributions with different domain, bins, or classes")
+
+        self._mass += other._mass * weight
+        for dist, odist in zip(self._distributions, other._distributions):
+            dist._scale += odist._scale * weight
+            dist._wsum += odist._wsum * weight
+            dist._ileft = min(dist._ileft, odist._ileft)
+            dist._iright = max(dist._iright, odist._iright)
+            dist._invalidate()
+        return self
+
+
+    def __iadd__ (self, other):
+        return self.merge (other)
+
+
+    def reset (self):
+        """
+        Clear distributions
+        """
+        for dist in self._distributions:
+            dist.reset()
+
+
+    def _index (self, labels) -> np.ndarray:
+        """
+        Map class labels to row indices
+        """
+        labels = np.asarray(labels).reshape(-1)
+        ordered = self._classes[self._sorter]
+
+        ## consecutive integer classes (such as -1, 0, 1) map by offset, otherwise by binary search
+        if self._consecutive:
+            finite = np.isfinite(labels) if labels.dtype.kind == 'f' else True
+            pos = np.clip(np.where(finite, labels, ordered[0]), ordered[0], ordered[-1]).astype(np.intp) - int(ordered[0])
+        else:
+            pos = np.clip(np.searchsorted(ordered, labels), 0, len(ordered)-1)
+
+        if not np.all(ordered[pos] == labels):
+            raise Exception ("unknown class label(s): %s" % np.unique(labels[ordered[pos] != labels]))
+        return self._sorter[pos]
+
+
+##
+##  UNIT TESTS
+##
+
+class TestGroupedDistribution(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self._labels = rng.integers(-1, 2, size=10000).astype(float)
+        self._events = rng.normal(size=10000) * 0.5 + self._labels
+
+
+    def test_grouped(self):
+        grouped = GroupedEmpiricalDistribution1D ([-3,3], 100)
+        grouped.addEventList (self._events, self._labels)
+
+        for label in [-1, 0, 1]:
+            single = EmpiricalDistribution1D ([-3,3], 100)
+            single.addEventList (self._events[self._labels == label])
+
+            view = grouped[label]
+            self.assertTrue (np.shares_memory (view._mass, grouped.mass))
+            self.assertTrue (np.allclose (view._mass, single._mass))
+            self.assertAlmostEqual (view.mean(), single.mean())
+            self.assertAlmostEqual (view.median(), single.median())
+            self.assertEqual ((view._ileft, view._iright), (single._ileft, single._iright))
+
+        self.assertRaises (Exception, grouped.addEventList, [0.0], [2])
+        for label in [np.nan, np.inf, -np.inf, 0.5]:
+            self.assertRaisesRegex (Exception, "unknown class label", grouped.addEventList, [0.0, 0.0], [0.0, label])
+            self.assertRaisesRegex (Exception, "unknown class label", grouped.__getitem__, label)
+
+
+    def test_views(self):
+        grouped = GroupedEmpiricalDistribution1D ([-3,3], 100)
+        grouped.addEventList (self._events, self._labels)
+        other = EmpiricalDistribution1D ([-3,3], 100)
+        other.addEventList (self._events[:1000])
+        narrow = EmpiricalDistribution1D ([-1,1], 21)
+        narrow.addEventList (self._events[:1000])
+
+        ## row views are updated in place by every mutation of the distribution
+        view = grouped[1]
+        mutations = [
+            lambda: view.merge (other),
+            lambda: view.merge (narrow),
+            lambda: view.addEvent (0.5),
+            lambda: view.addEventList (self._events[:100]),
+            lambda: view.addEventRange (-0.5, 0.5),
+            lambda: view.reset()]
+
+        for mutate in mutations:
+            mutate()
+            self.assertTrue (np.shares_memory (view._mass, grouped.mass))
+            self.assertTrue (np.array_equal (view._mass, grouped.mass[2]))
+
+
+    def test_merge(self):
+        whole = GroupedEmpiricalDistribution1D ([-3,3], 100)
+        whole.addEventList (self._events, self._labels)
+        part1 = GroupedEmpiricalDistribution1D ([-3,3], 100)
+        part1.addEventList (self._events[:5000], self._labels[:5000])
+        part2 = GroupedEmpiricalDistribution1D ([-3,3], 100)
+        part2.addEventList (self._events[5000:], self._labels[5000:])
+        part1 += part2
+
+        self.assertTrue (np.allclose (whole.mass, part1.mass))
+        self.assertAlmostEqual (whole[1].mean(), part1[1].mean())
+
+
+
+if __name__ == '__main__':
+
+    unittest.main()
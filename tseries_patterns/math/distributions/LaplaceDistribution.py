@@ -54,6 +54,28 @@ class LaplaceDistribution:
         return -(np.abs(x - self.mu) + beta * np.log(2 * beta)) / beta
 
 
+    def fit(self, x, weights = None):
+        """
+        Weighted maximum-likelihood estimate of the parameters (the M-step of EM): the weighted median and
+        weighted mean absolute deviation from it
+
+        :param x: vector of observations
+        :param weights: (optional) weight of each observation
+        :return: self
+        """
+        x = np.asarray(x, dtype=float)
+        w = np.ones(x.shape[0]) if weights is None else np.asarray(weights, dtype=float)
+        W = w.sum()
+        if W <= 0:
+            return self
+
+        order = np.argsort(x)
+        cumw = np.cumsum(w[order])
+        self.mu = float(x[order[np.searchsorted(cumw, 0.5 * cumw[-1])]])
+        self.beta = max(float(np.dot(w, np.abs(x - self.mu)) / W), 1e-6)
+        return self
+
+
     def cum(self, x0: float, x1: float):
         """
         cumulative density function
@@ -52,7 +52,8 @@ class NormalDistribution:
         :param x: value on domain or an array of values
         :return:
         """
-        return np.log(self.dist.pdf(x))
+        z = (np.asarray(x) - self.mu) / self.sigma
+        return -0.5 * z * z - np.log(self.sigma) - 0.5 * np.log(2 * np.pi)
 
 
     def cum(self, x0: float, x1: float):
@@ -61,3 +62,23 @@ class NormalDistribution:
         """
         return self.dist.cdf(x1) - self.dist.cdf(x0)
 
+
+    def fit(self, x, weights = None):
+        """
+        Weighted maximum-likelihood estimate of the parameters (the M-step of EM)
+
+        :param x: vector of observations
+        :param weights: (optional) weight of each observation
+        :return: self
+        """
+        x = np.asarray(x, dtype=float)
+        w = np.ones(x.shape[0]) if weights is None else np.asarray(weights, dtype=float)
+        W = w.sum()
+        if W <= 0:
+            return self
+
+        self.mu = float(np.dot(w, x) / W)
+        self.sigma = max(float(np.sqrt(np.dot(w, (x - self.mu)**2) / W)), 1e-6)
+        self.dist = scipy.stats.norm(self.mu, self.sigma)
+        return self
+
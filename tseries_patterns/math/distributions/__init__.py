@@ -2,3 +2,6 @@ from .ExponentialDistribution import ExponentialDistribution
 from .NormalDistribution import NormalDistribution
 from .LaplaceDistribution import LaplaceDistribution
 from .EmpiricalDistribution1D import EmpiricalDistribution1D
+from .DecayingEmpiricalDistribution1D import DecayingEmpiricalDistribution1D
+from .QuantileSketch import QuantileSketch
+from .GroupedEmpiricalDistribution1D import GroupedEmpiricalDistribution1D
@@ -0,0 +1,107 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import numpy as np
+
+from tseries_patterns.math.distributions import NormalDistribution, LaplaceDistribution, ExponentialDistribution
+from tseries_patterns.ml.hmm.HMMKernels import emissions, EMISSION_KINDS
+
+
+class EmissionEngine:
+    """
+    Evaluates the emission log-densities of all HMM states into an (n x K) matrix.
+
+    States whose distribution function is the `logf` of a NormalDistribution, LaplaceDistribution, or
+    ExponentialDistribution are evaluated in closed form in a single compiled pass over the observations;
+    any other distribution function is called as given.
+    """
+
+    def __init__(self, distributions):
+        """
+        :param distributions: list of distribution functions, each provided with observation vector yields log prob vector
+        """
+        self.distributions = distributions
+        self.nstates = len(distributions)
+
+
+    def __call__(self, x) -> np.ndarray:
+        """
+        Emission log-densities
+
+        :param x: vector of observations (or (n, 1) matrix)
+        :return: (n, K) matrix of log-densities, one column per state
+        """
+        x = np.asarray(x)
+        if x.ndim == 2:
+            x = x[:,0]
+        return self.evaluate(x)
+
+
+    def evaluate (self, x, out = None) -> np.ndarray:
+        """
+        Emission log-densities
+
+        :param x: vector of observations
+        :param out: (optional) preallocated (n, K) matrix, written in place
+        :return: (n, K) matrix of log-densities
+        """
+        x = np.asarray(x, dtype=np.double).reshape(-1)
+        if out is None:
+            out = np.empty((x.shape[0], self.nstates))
+
+        kinds, params = self.parameters()
+        return _fill (self.distributions, x, kinds, params, out)
+
+
+    def parameters (self):
+        """
+        Closed-form description of each state's distribution
+
+        :return: tuple of int32 kinds (see HMMKernels.EMISSION_KINDS, -1 where not closed-form) and (K, 3) parameters
+        """
+        kinds = np.full(self.nstates, -1, dtype=np.int32)
+        params = np.zeros((self.nstates, 3))
+
+        for ci, f in enumerate(self.distributions):
+            dist = getattr(f, "__self__", None)
+            func = getattr(f, "__func__", None)
+            if func is NormalDistribution.logf:
+                kinds[ci] = EMISSION_KINDS["normal"]
+                params[ci,:2] = dist.mu, dist.sigma
+            elif func is LaplaceDistribution.logf:
+                kinds[ci] = EMISSION_KINDS["laplace"]
+                params[ci,:2] = dist.mu, dist.beta
+            elif func is ExponentialDistribution.logf:
+                kinds[ci] = EMISSION_KINDS["exponential"]
+                params[ci,:] = dist.base, dist.decay, dist.dir
+
+        return kinds, params
+
+
+def _fill (distributions, x: np.ndarray, kinds: np.ndarray, params: np.ndarray, out: np.ndarray) -> np.ndarray:
+    emissions (x, kinds, params, out)
+    for ci in np.where(kinds < 0)[0]:
+        out[:,ci] = distributions[ci] (x.reshape(-1,1)).flatten()
+    return out
+
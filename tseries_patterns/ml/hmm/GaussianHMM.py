@@ -27,6 +27,9 @@ import numpy as np
 import pandas as pd
 import hmmlearn
 
+from tseries_patterns.common import stage
+from tseries_patterns.ml.hmm.SparseTransitions import SparseTransitions, SPARSE_DENSITY, dense
+from tseries_patterns.ml.hmm.HMMKernels import viterbi, viterbi_sparse, viterbi_checkpointed, viterbi_batch, flatten_batch, log_parameters
 
 
 class GaussianHMM(hmmlearn.hmm.GaussianHMM):
@@ -41,6 +44,7 @@ class GaussianHMM(hmmlearn.hmm.GaussianHMM):
         ----------
         transition_matrix : :class:`ndarray`
             (Optional) Transition matrix of probabilities, if not specified then must be trained
+            (may be scipy.sparse or SparseTransitions; sparse matrices are decoded with the sparse kernel)
         means : :class:`ndarray`
             (Optional) 2D Means of the distributions, if not specified then must be trained
         state_probs : :class:`ndarray`
@@ -85,7 +89,7 @@ class GaussianHMM(hmmlearn.hmm.GaussianHMM):
             init_params=have
         )
 
-        self.transmat_ = transition_matrix
+        self.transmat_ = dense(transition_matrix)
         self.means_ = means
         self.startprob_ = state_probs
         self.covars_ = covar_matrix
@@ -97,28 +101,59 @@ class GaussianHMM(hmmlearn.hmm.GaussianHMM):
         """
         super().fit(X)
 
-    def predict(self, srs):
+    def predict(self, srs, low_memory=False):
         """
         The hmm_model.predict() functionality has the common issue where
         Series need to be be converted to values & reshaped, this does that
-        conversion and then uses the ``super().predict`` method from the
-        hmm module
+        conversion and then decodes with the compiled viterbi kernel
         Parameters
         ----------
         srs : :class:`Series` or :class:`ndarray`
             to predict
+        low_memory : :class:`bool`
+            if true, decode with checkpointed viterbi, holding O(sqrt(n)) state and
+            int8 backpointers rather than (n x K) lattices; yields the same path, as int8 rather than int64 states
         Returns
         -------
         :class:`Series` or :class:`ndarray`
             Prediction
         """
-        if isinstance(srs, pd.Series):
-            arr = srs.values.reshape(-1, 1)
-            res = pd.Series(super().predict(arr), index=srs.index)
+        with stage ("GaussianHMM.predict", len(srs)):
+            if isinstance(srs, pd.Series):
+                arr = srs.values.reshape(-1, 1)
+                res = pd.Series(self._decode(arr, low_memory), index=srs.index)
 
-        elif isinstance(srs, np.ndarray):
-            arr = srs.reshape(-1, 1)
-            res = super().predict(arr)
+            elif isinstance(srs, np.ndarray):
+                arr = srs.reshape(-1, 1)
+                res = self._decode(arr, low_memory)
 
         return res
 
+    def predictBatch(self, X, lengths=None, threads=None):
+        """
+        Predict state sequences of a batch of series in one call: emissions are computed for the whole batch
+        at once and the viterbi recursion run across series in parallel (GIL-free) threads
+
+        :param X: (series x time) matrix, list of series, or concatenated vector of series (with lengths)
+        :param lengths: (optional) lengths of the series where X is a concatenated vector
+        :param threads: number of threads (default: # of cores)
+        :return: int8 (series x time) state matrix, padded with -1 beyond the end of shorter series
+        """
+        x, lengths = flatten_batch(X, lengths)
+        with stage ("GaussianHMM.predictBatch", x.shape[0]):
+            logpi, logA = log_parameters(self.startprob_, self.transmat_)
+            E = self._compute_log_likelihood(x.reshape(-1, 1))
+            return viterbi_batch(E, lengths, logpi, logA, threads=threads)
+
+    def _decode(self, X, low_memory=False):
+        logpi, logA = log_parameters(self.startprob_, self.transmat_)
+        if low_memory:
+            _, states = viterbi_checkpointed(lambda start, end: self._compute_log_likelihood(X[start:end]), X.shape[0], logpi, logA)
+        else:
+            transitions = SparseTransitions(self.transmat_)
+            if transitions.density <= SPARSE_DENSITY:
+                _, states = viterbi_sparse(self._compute_log_likelihood(X), logpi, transitions)
+            else:
+                _, states = viterbi(self._compute_log_likelihood(X), logpi, logA)
+        return states
+
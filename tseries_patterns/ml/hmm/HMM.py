@@ -23,12 +23,19 @@
 #
 
 
+import unittest
 import numpy as np
 import pandas as pd
 import hmmlearn.hmm
+from concurrent.futures import ProcessPoolExecutor
 
 from hmmlearn.hmm import _BaseHMM
 
+from tseries_patterns.common import stage
+from tseries_patterns.ml.hmm.SparseTransitions import SparseTransitions, SPARSE_DENSITY, dense
+from tseries_patterns.ml.hmm.HMMKernels import viterbi, viterbi_sparse, viterbi_checkpointed, viterbi_batch, flatten_batch, forward_backward, log_parameters
+from tseries_patterns.ml.hmm.EmissionEngine import EmissionEngine
+
 
 
 class HMM(_BaseHMM):
@@ -37,7 +44,7 @@ class HMM(_BaseHMM):
         Generic HMM is supplied with a distribution function, one per state
 
         :param distributions: list of distribution functions, each provided with observation vector yields log prob vector
-        :param transition_matrix: transition probabilities
+        :param transition_matrix: transition probabilities (dense, scipy.sparse, or SparseTransitions)
         :param state_probs: prior probability of being in any given state
         """
         self.nstates = len(state_probs)
@@ -48,50 +55,381 @@ class HMM(_BaseHMM):
             transmat_prior=0)
 
         self.distributions = distributions
-        self.transmat_ = transition_matrix
+        self.emissions = EmissionEngine(distributions)
+        self.transmat_ = dense(transition_matrix)
         self.startprob_ = state_probs
 
 
-    def fit(self, X):
+    def fit(self, X, lengths=None, n_iter=100, tol=1e-6, restarts=0, processes=None, seed=None):
         """
-        Train HMM, adjusting an variable not given
-        :param X: series of states to train over
+        Train HMM with Baum-Welch (EM), re-estimating the transition matrix, state probabilities, and the
+        parameters of each state distribution providing a `fit` M-step (NormalDistribution, LaplaceDistribution,
+        and ExponentialDistribution).  Other distribution functions are held fixed.
+
+        With restarts, EM is additionally run from `restarts` random initializations across a process pool,
+        keeping the fit with the highest log-likelihood (the distributions must then be picklable).  Fitted
+        parameters are written back into the given distribution objects.
+
+        :param X: series of observations to train over (the concatenated sequences if lengths given)
+        :param lengths: (optional) lengths of the individual sequences in X
+        :param n_iter: maximum number of EM iterations
+        :param tol: convergence threshold on the gain in log-likelihood
+        :param restarts: number of additional randomly initialized EM runs
+        :param processes: number of processes to run restarts across (default: # of cores)
+        :param seed: random seed for the restart initializations
+        :return: self
         """
-        raise "fit not implemented"
+        if n_iter < 1:
+            raise Exception ("n_iter must be at least 1")
+
+        x = np.array(X.values if isinstance(X, pd.Series) else X, dtype=float).reshape(-1)
+        lengths = [x.shape[0]] if lengths is None else [int(n) for n in lengths]
+        if sum(lengths) != x.shape[0]:
+            raise Exception ("lengths sum to %d, but have %d observations" % (sum(lengths), x.shape[0]))
+
+        with stage ("HMM.fit", x.shape[0]):
+            if restarts > 0:
+                seeds = np.random.SeedSequence(seed).spawn(restarts)
+                jobs = [(self, x, lengths, n_iter, tol, s) for s in [None] + seeds]
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    fits = list(pool.map(_fit_restart, jobs))
+
+                self._assign(max(fits, key=lambda hmm: hmm.loglik_))
+            else:
+                self._baum_welch(x, lengths, n_iter, tol)
 
+        return self
 
-    def predict(self, srs):
+
+    def predict(self, srs, low_memory=False):
         """
         The hmm_model.predict() functionality has the common issue where
         Series need to be be converted to values & reshaped, this does that
-        conversion and then uses the ``super().predict`` method from the
-        hmm module
+        conversion and then decodes with the compiled viterbi kernel
         Parameters
         ----------
         srs : :class:`Series` or :class:`ndarray`
             to predict
+        low_memory : :class:`bool`
+            if true, decode with checkpointed viterbi, holding O(sqrt(n)) state and
+            int8 backpointers rather than (n x K) lattices; yields the same path, as int8 rather than int64 states
         Returns
         -------
         :class:`Series` or :class:`ndarray`
             Prediction
         """
-        if isinstance(srs, pd.Series):
-            arr = srs.values.reshape(-1, 1)
-            res = pd.Series(super().predict(arr), index=srs.index)
+        with stage ("HMM.predict", len(srs)):
+            if isinstance(srs, pd.Series):
+                arr = srs.values.reshape(-1, 1)
+                res = pd.Series(self._decode(arr, low_memory), index=srs.index)
 
-        elif isinstance(srs, np.ndarray):
-            arr = srs.reshape(-1, 1)
-            res = super().predict(arr)
+            elif isinstance(srs, np.ndarray):
+                arr = srs.reshape(-1, 1)
+                res = self._decode(arr, low_memory)
 
         return res
 
 
+    def predictBatch(self, X, lengths=None, threads=None):
+        """
+        Predict state sequences of a batch of series in one call: emissions are computed for the whole batch
+        at once and the viterbi recursion run across series in parallel (GIL-free) threads
+
+        :param X: (series x time) matrix, list of series, or concatenated vector of series (with lengths)
+        :param lengths: (optional) lengths of the series where X is a concatenated vector
+        :param threads: number of threads (default: # of cores)
+        :return: int8 (series x time) state matrix, padded with -1 beyond the end of shorter series
+        """
+        x, lengths = flatten_batch(X, lengths)
+        with stage ("HMM.predictBatch", x.shape[0]):
+            logpi, logA = log_parameters(self.startprob_, self.transmat_)
+            E = self._compute_log_likelihood(x.reshape(-1, 1))
+            return viterbi_batch(E, lengths, logpi, logA, threads=threads)
+
+
+    def score_samples(self, X, lengths=None):
+        """
+        Log-likelihood and state posteriors of a single sequence, by way of the compiled forward-backward kernel
+        """
+        if lengths is not None:
+            return super().score_samples(X, lengths)
+
+        logpi, logA = log_parameters(self.startprob_, self.transmat_)
+        loglik, posteriors, _ = forward_backward(self._compute_log_likelihood(X), logpi, logA)
+        return loglik, posteriors
+
+
+    def _baum_welch(self, x, lengths, n_iter, tol):
+        n = x.shape[0]
+        K = self.nstates
+        bounds = np.concatenate(([0], np.cumsum(lengths)))
+        fittable = self._fittable()
+
+        self.transmat_ = np.asarray(self.transmat_, dtype=float)
+        self.startprob_ = np.asarray(self.startprob_, dtype=float)
+
+        posteriors = np.empty((n, K))
+        previous = -np.inf
+        for it in range(n_iter):
+            # E-step: scaled forward-backward over each sequence
+            E = self._compute_log_likelihood(x)
+            logpi, logA = log_parameters(self.startprob_, self.transmat_)
+
+            loglik = 0.0
+            xi = np.zeros((K, K))
+            start = np.zeros(K)
+            for i in range(len(lengths)):
+                Istart, Iend = bounds[i], bounds[i+1]
+                if Iend == Istart:
+                    continue
+                ll, post, counts = forward_backward(E[Istart:Iend], logpi, logA)
+                if ll == -np.inf:
+                    raise Exception ("sequence %d has zero probability under the model" % i)
+                posteriors[Istart:Iend] = post
+                loglik += ll
+                xi += counts
+                start += post[0]
+
+            # M-step
+            self.startprob_ = start / start.sum()
+            rows = xi.sum(axis=1, keepdims=True)
+            self.transmat_ = np.where(rows > 0, xi / np.where(rows > 0, rows, 1.0), self.transmat_)
+            for ci, dist in enumerate(fittable):
+                if dist is not None:
+                    dist.fit(x, posteriors[:,ci])
+
+            self.loglik_ = loglik
+            self.n_iter_ = it + 1
+            if loglik - previous < tol:
+                break
+            previous = loglik
+
+
+    def _randomize(self, x, rng):
+        """
+        Random starting point for EM: distributions fit to soft assignments around randomly chosen centers,
+        and a randomly perturbed sticky transition matrix
+        """
+        K = self.nstates
+        centers = rng.choice(x, K, replace=False)
+        scale = np.std(x) / K if np.std(x) > 0 else 1.0
+        R = np.exp(-0.5 * ((x[:,None] - centers[None,:]) / scale)**2) + 1e-12
+        R /= R.sum(axis=1, keepdims=True)
+
+        for ci, dist in enumerate(self._fittable()):
+            if dist is not None:
+                dist.fit(x, R[:,ci])
+
+        self.transmat_ = 0.9 * np.eye(K) + 0.1 * rng.dirichlet(np.ones(K), size=K)
+        self.startprob_ = np.full(K, 1.0 / K)
+
+
+    def _assign(self, other):
+        """
+        Take fitted parameters from another (restart) HMM, writing distribution parameters into our objects
+        """
+        for mine, theirs in zip(self._fittable(), other._fittable()):
+            if mine is not None:
+                mine.__dict__.update(theirs.__dict__)
+
+        self.transmat_ = other.transmat_
+        self.startprob_ = other.startprob_
+        self.loglik_ = other.loglik_
+        self.n_iter_ = other.n_iter_
+
+
+    def _fittable(self):
+        dists = [getattr(f, "__self__", None) for f in self.distributions]
+        return [d if hasattr(d, "fit") else None for d in dists]
+
+
+    def _decode(self, X, low_memory=False):
+        logpi, logA = log_parameters(self.startprob_, self.transmat_)
+        if low_memory:
+            _, states = viterbi_checkpointed(lambda start, end: self._engine().evaluate(X[start:end,0]), X.shape[0], logpi, logA)
+        else:
+            transitions = SparseTransitions(self.transmat_)
+            if transitions.density <= SPARSE_DENSITY:
+                _, states = viterbi_sparse(self._compute_log_likelihood(X), logpi, transitions)
+            else:
+                _, states = viterbi(self._compute_log_likelihood(X), logpi, logA)
+        return states
+
+
     def _compute_log_likelihood(self, X):
         n = X.shape[0]
-        log_prob = np.empty((n, self.nstates))
-
-        for ci in range(0, self.nstates):
-            log_prob[:,ci] = self.distributions[ci] (X).flatten()
+        with stage ("HMM.emissions", n):
+            log_prob = self._engine() (X)
 
         return log_prob
 
+
+    def _engine(self):
+        if self.emissions.distributions is not self.distributions:
+            self.emissions = EmissionEngine(self.distributions)
+        return self.emissions
+
+
+##
+## External function running one EM fit (from the given or a random starting point) in a worker
+##
+def _fit_restart(job):
+    hmm, x, lengths, n_iter, tol, seed = job
+    if seed is not None:
+        hmm._randomize(x, np.random.default_rng(seed))
+    hmm._baum_welch(x, lengths, n_iter, tol)
+    return hmm
+
+
+##
+##  UNIT TESTS
+##
+
+class TestHMM(unittest.TestCase):
+
+    def setUp(self):
+        from tseries_patterns.math.distributions import NormalDistribution
+
+        rng = np.random.default_rng(1)
+        states = np.cumsum(rng.random(5000) > 0.99) % 2
+        self._x = np.where(states == 0, -1.0, 1.0) + rng.normal(0.0, 0.7, 5000)
+        self._states = states
+
+        self._transmat = np.array([[0.99, 0.01], [0.01, 0.99]])
+        self._hmm = HMM (
+            [NormalDistribution(-1.0, 0.7).logf, NormalDistribution(1.0, 0.7).logf], self._transmat, [0.5, 0.5])
+
+
+    def test_series(self):
+        ## series values are read-only (copy-on-write): decoded without copying into the kernels
+        series = pd.Series(self._x, index=pd.date_range("2020-01-01", periods=len(self._x), freq="min"))
+        states = self._hmm.predict (series)
+
+        self.assertTrue (states.index.equals (series.index))
+        self.assertTrue (np.array_equal (states.values, self._hmm.predict (np.array(self._x))))
+        self.assertTrue (np.array_equal (self._hmm.predict (series, low_memory=True).values, states.values))
+
+        logpi, logA = log_parameters (self._hmm.startprob_, self._hmm.transmat_)
+        E = self._hmm._compute_log_likelihood (self._x.reshape(-1,1))
+        E.flags.writeable = False
+        self.assertTrue (np.array_equal (viterbi (E, logpi, logA)[1], states.values))
+
+
+    def test_filter(self):
+        from tseries_patterns.ml.hmm.HMMFilter import HMMFilter
+
+        series = pd.Series(self._x)
+        hmmfilter = HMMFilter (self._hmm)
+        probs = hmmfilter.filter (series)
+
+        ## normalized forward pass
+        E = self._hmm._compute_log_likelihood (self._x.reshape(-1,1))
+        alpha = np.asarray(self._hmm.startprob_) * np.exp(E[0])
+        loglik = np.log(alpha.sum())
+        expected = np.empty_like(E)
+        expected[0] = alpha / alpha.sum()
+        for t in range(1, len(self._x)):
+            alpha = (expected[t-1] @ self._transmat) * np.exp(E[t])
+            loglik += np.log(alpha.sum())
+            expected[t] = alpha / alpha.sum()
+
+        self.assertTrue (np.allclose (probs, expected))
+        self.assertAlmostEqual (hmmfilter.loglik, loglik, places=6)
+        self.assertAlmostEqual (hmmfilter.loglik, self._hmm.score_samples (self._x.reshape(-1,1))[0], places=6)
+        self.assertEqual (hmmfilter.count, len(self._x))
+
+
+    def test_fit(self):
+        from tseries_patterns.math.distributions import NormalDistribution
+
+        ## sequences from a known 2-state model
+        rng = np.random.default_rng(2)
+        A = np.array([[0.98, 0.02], [0.03, 0.97]])
+        means, sigmas = np.array([-1.0, 1.5]), np.array([0.5, 0.8])
+
+        sequences = []
+        for _ in range(4):
+            s = np.empty(3000, dtype=np.int64)
+            s[0] = rng.integers(0, 2)
+            for t in range(1, len(s)):
+                s[t] = rng.random() < A[s[t-1], 1]
+            sequences.append (means[s] + rng.normal(0.0, 1.0, len(s)) * sigmas[s])
+
+        for restarts in (0, 2):
+            dists = [NormalDistribution(-0.5, 1.0), NormalDistribution(0.5, 1.0)]
+            hmm = HMM ([d.logf for d in dists], np.array([[0.9, 0.1], [0.1, 0.9]]), [0.5, 0.5])
+            hmm.fit (pd.Series(np.concatenate(sequences)), lengths=[3000] * 4, restarts=restarts, processes=2, seed=1)
+
+            ## states recovered up to labeling
+            order = np.argsort([d.mu for d in dists])
+            self.assertTrue (np.allclose ([dists[i].mu for i in order], means, atol=0.05))
+            self.assertTrue (np.allclose ([dists[i].sigma for i in order], sigmas, atol=0.05))
+            self.assertTrue (np.allclose (hmm.transmat_[order][:,order], A, atol=0.01))
+            self.assertTrue (np.isfinite (hmm.loglik_))
+
+        self.assertRaises (Exception, hmm.fit, self._x, n_iter=0)
+
+
+    def test_hmmlearn(self):
+        ## compiled decode and forward-backward agree with hmmlearn on the same gaussian model
+        reference = hmmlearn.hmm.GaussianHMM (n_components=2, covariance_type="diag")
+        reference.startprob_ = np.array([0.5, 0.5])
+        reference.transmat_ = self._transmat
+        reference.means_ = np.array([[-1.0], [1.0]])
+        reference.covars_ = np.array([[0.49], [0.49]])
+
+        X = self._x.reshape(-1,1)
+        logp, states = reference.decode (X, algorithm="viterbi")
+        loglik, posteriors = reference.score_samples (X)
+
+        logpi, logA = log_parameters (self._hmm.startprob_, self._hmm.transmat_)
+        E = self._hmm._compute_log_likelihood (X)
+        self.assertTrue (np.array_equal (self._hmm.predict (self._x), states))
+        self.assertAlmostEqual (viterbi (E, logpi, logA)[0], logp, delta=1e-8 * abs(logp))
+
+        mine, post, _ = forward_backward (E, logpi, logA)
+        self.assertAlmostEqual (mine, loglik, delta=1e-8 * abs(loglik))
+        self.assertTrue (np.allclose (post, posteriors, atol=1e-8))
+
+
+    def test_batch(self):
+        ## ragged batch: each row the dense decode of its series, padded with -1
+        lengths = [700, 1, 0, 2500, 1799]
+        series = np.split (self._x, np.cumsum(lengths)[:-1])
+
+        for threads in (1, 4):
+            states = self._hmm.predictBatch ([pd.Series(s) for s in series], threads=threads)
+            self.assertEqual (states.shape, (5, 2500))
+            self.assertEqual (states.dtype, np.int8)
+
+            for row, s in zip(states, series):
+                self.assertTrue (np.array_equal (row[:len(s)], self._hmm.predict (s)))
+                self.assertTrue (np.all (row[len(s):] == -1))
+
+            flat = self._hmm.predictBatch (self._x, lengths=lengths, threads=threads)
+            self.assertTrue (np.array_equal (flat, states))
+
+
+    def test_low_memory(self):
+        ## checkpointed path equals the dense path, over segment lengths and up to the int8 state limit (64)
+        rng = np.random.default_rng(3)
+        for K in (2, 64):
+            E = np.log(rng.random((1000, K)))
+            logpi = np.log(np.full(K, 1.0 / K))
+            logA = np.log(rng.dirichlet(np.ones(K), size=K))
+            logp, states = viterbi (E, logpi, logA)
+
+            for segment in (None, 1, 7, 1000):
+                clogp, cstates = viterbi_checkpointed (lambda start, end: E[start:end], E.shape[0], logpi, logA, segment=segment)
+                self.assertEqual (cstates.dtype, np.int8)
+                self.assertTrue (np.array_equal (cstates, states))
+                self.assertAlmostEqual (clogp, logp, delta=1e-9 * abs(logp))
+
+        E = np.zeros((10, 65))
+        self.assertRaises (Exception, viterbi_checkpointed, lambda start, end: E[start:end], 10, np.zeros(65), np.zeros((65, 65)))
+
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -54,13 +54,11 @@ class HMM2State(GaussianHMM):
         ss_prob=0.999,
         state_probs=np.array([1 / 2, 1 / 2])):
 
-        means = np.array([[means[0], means[0]],[means[1], means[1]]])
-        #means = np.array([[means[0]],[means[1]]])
+        means = np.array([[means[0]],[means[1]]])
 
         transition_matrix = np.array([[ss_prob, 1 - ss_prob], [1 - ss_prob, ss_prob]])
 
-        cov_mat = covar * np.tile(np.eye(2), [2, 1, 1])
-        #cov_mat = covar * np.tile(np.eye(1), [2, 1, 1])
+        cov_mat = covar * np.tile(np.eye(1), [2, 1, 1])
 
         super().__init__(
             transition_matrix=transition_matrix,
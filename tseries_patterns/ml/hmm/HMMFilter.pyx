@@ -0,0 +1,278 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# cython: boundscheck=False, wraparound=False, cdivision=True
+
+import numpy as np
+from libc.math cimport exp, log, fabs, sqrt, INFINITY
+
+from tseries_patterns.ml.hmm.EmissionEngine import EmissionEngine
+from tseries_patterns.ml.hmm.HMMKernels import EMISSION_KINDS
+
+cdef int EMIT_NORMAL = EMISSION_KINDS["normal"]
+cdef int EMIT_LAPLACE = EMISSION_KINDS["laplace"]
+cdef int EMIT_EXPONENTIAL = EMISSION_KINDS["exponential"]
+
+
+cdef class HMMFilter:
+    """
+    Streaming forward filter, yielding the posterior probability of each state given the observations so far.
+
+    The filter is built from an existing HMM, GaussianHMM (univariate), or WalkforwardHMM, taking its transition
+    matrix, start probabilities, and emission distributions.  Normal, Laplace, and Exponential emissions (and
+    the gaussian emissions of GaussianHMM) are evaluated in closed form, in which case `update` is O(K^2)
+    with no allocation; other distribution functions are called as given.
+
+    `update` returns the same (internal) probability vector on each call, overwritten in place; copy it to
+    retain a prior value.
+    """
+    cdef object _model
+    cdef object _distributions
+    cdef Py_ssize_t _K
+    cdef double[::1] _pi
+    cdef double[:,::1] _A
+    cdef int[::1] _kinds
+    cdef double[:,::1] _params
+    cdef double[::1] _alpha
+    cdef double[::1] _pred
+    cdef double[::1] _e
+    cdef object _probs
+    cdef object _x
+    cdef bint _generic
+    cdef long _t
+    cdef double _loglik
+
+    def __init__(self, model):
+        """
+        :param model: HMM, GaussianHMM (univariate), or WalkforwardHMM instance
+        """
+        self._model = model
+        if hasattr(model, "distributions"):
+            transitions = model.transmat_ if hasattr(model, "transmat_") else model.transition_matrix
+            startprob = model.startprob_ if hasattr(model, "startprob_") else model.state_probs
+            self._distributions = model.distributions
+            kinds, params = EmissionEngine(model.distributions).parameters()
+
+        elif hasattr(model, "means_"):
+            transitions = model.transmat_
+            startprob = model.startprob_
+            means = np.asarray(model.means_, dtype=np.double)
+            if means.ndim != 2 or means.shape[1] != 1:
+                raise Exception ("HMMFilter requires univariate emissions, model has means of shape %s" % (means.shape,))
+
+            K = means.shape[0]
+            self._distributions = None
+            kinds = np.full(K, EMIT_NORMAL, dtype=np.int32)
+            params = np.zeros((K, 3))
+            params[:,0] = means[:,0]
+            covars = model._covars_ if hasattr(model, "_covars_") else model.covars_
+            params[:,1] = np.sqrt(np.asarray(covars, dtype=np.double).reshape(K, -1)[:,0])
+
+        else:
+            raise Exception ("cannot build filter from %s" % type(model).__name__)
+
+        self._K = len(kinds)
+        self._pi = np.ascontiguousarray(startprob, dtype=np.double)
+        self._A = np.ascontiguousarray(transitions, dtype=np.double)
+        self._kinds = np.ascontiguousarray(kinds, dtype=np.int32)
+        self._params = np.ascontiguousarray(params, dtype=np.double)
+        self._generic = bool(np.any(np.asarray(kinds) < 0))
+
+        if self._pi.shape[0] != self._K or self._A.shape[0] != self._K or self._A.shape[1] != self._K:
+            raise Exception ("state probabilities and transition matrix must match %d states" % self._K)
+
+        self._probs = np.zeros(self._K)
+        self._alpha = self._probs
+        self._pred = np.zeros(self._K)
+        self._e = np.zeros(self._K)
+        self._x = np.zeros((1,1))
+        self.reset()
+
+    def __reduce__(self):
+        return (self.__class__, (self._model,), self.snapshot())
+
+    def __setstate__(self, state):
+        self.restore(state)
+
+
+    def reset (self):
+        """
+        Reset to start of a new series
+        """
+        self._t = 0
+        self._loglik = 0.0
+        self._alpha[:] = self._pi
+
+
+    def update (self, double x):
+        """
+        Advance by one observation
+
+        :param x: observation
+        :return: filtered probability of each state (internal vector, overwritten by the next update)
+        """
+        self._emit(x)
+        self._step()
+        return self._probs
+
+
+    def filter (self, x, out = None):
+        """
+        Advance across a series of observations
+
+        :param x: series of observations
+        :param out: (optional) preallocated (n, K) matrix of state probabilities, written in place
+        :return: (n, K) matrix of filtered state probabilities, one row per observation
+        """
+        cdef const double[:] xv = np.asarray(getattr(x, "values", x), dtype=np.double).reshape(-1)
+        cdef Py_ssize_t n = xv.shape[0]
+        cdef Py_ssize_t t, j
+
+        if out is None:
+            out = np.empty((n, self._K))
+        if out.shape[0] != n or out.shape[1] != self._K:
+            raise Exception ("out must have shape (%d, %d)" % (n, self._K))
+
+        cdef double[:,:] ov = out
+        for t in range(n):
+            self._emit(xv[t])
+            self._step()
+            for j in range(self._K):
+                ov[t,j] = self._alpha[j]
+
+        return out
+
+
+    def snapshot (self):
+        """
+        Capture filter state, to be restored later with restore()
+
+        :return: tuple of state probabilities, # of observations, and log-likelihood
+        """
+        return (np.array(self._alpha), self._t, self._loglik)
+
+
+    def restore (self, state):
+        """
+        Restore filter state captured with snapshot()
+        """
+        probs, t, loglik = state
+        self._probs[:] = probs
+        self._t = t
+        self._loglik = loglik
+
+
+    @property
+    def probabilities (self):
+        """
+        Copy of the current filtered state probabilities
+        """
+        return np.array(self._alpha)
+
+    @property
+    def state (self) -> int:
+        """
+        Most likely current state
+        """
+        return int(np.argmax(self._probs))
+
+    @property
+    def loglik (self) -> float:
+        """
+        Log-likelihood of the observations so far
+        """
+        return self._loglik
+
+    @property
+    def count (self) -> int:
+        """
+        Number of observations seen
+        """
+        return self._t
+
+
+    #
+    #   Implementation
+    #
+
+    cdef void _emit (self, double x):
+        cdef Py_ssize_t j
+        cdef double z
+        cdef int kind
+
+        for j in range(self._K):
+            kind = self._kinds[j]
+            if kind == EMIT_NORMAL:
+                z = (x - self._params[j,0]) / self._params[j,1]
+                self._e[j] = -0.5 * z * z - log(self._params[j,1]) - 0.9189385332046727
+            elif kind == EMIT_LAPLACE:
+                self._e[j] = -fabs(x - self._params[j,0]) / self._params[j,1] - log(2.0 * self._params[j,1])
+            elif kind == EMIT_EXPONENTIAL:
+                self._e[j] = log(self._params[j,1]) - self._params[j,1] * self._params[j,2] * (x - self._params[j,0])
+
+        if self._generic:
+            self._x[0,0] = x
+            for j in range(self._K):
+                if self._kinds[j] < 0:
+                    self._e[j] = np.asarray(self._distributions[j] (self._x)).flat[0]
+
+
+    cdef void _step (self) noexcept nogil:
+        cdef Py_ssize_t K = self._K
+        cdef Py_ssize_t i, j
+        cdef double m, s, v
+
+        # predict
+        if self._t == 0:
+            for j in range(K):
+                self._pred[j] = self._alpha[j]
+        else:
+            for j in range(K):
+                v = 0.0
+                for i in range(K):
+                    v += self._alpha[i] * self._A[i,j]
+                self._pred[j] = v
+
+        # correct, with emissions scaled by their maximum
+        m = self._e[0]
+        for j in range(1, K):
+            if self._e[j] > m:
+                m = self._e[j]
+
+        s = 0.0
+        for j in range(K):
+            self._alpha[j] = self._pred[j] * exp(self._e[j] - m)
+            s += self._alpha[j]
+
+        if s > 0:
+            for j in range(K):
+                self._alpha[j] /= s
+            self._loglik += log(s) + m
+        else:
+            # observation impossible under all states: carry the prediction forward
+            for j in range(K):
+                self._alpha[j] = self._pred[j]
+            self._loglik = -INFINITY
+
+        self._t += 1
@@ -0,0 +1,226 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import itertools
+import unittest
+import numpy as np
+import pandas as pd
+import hmmlearn.hmm
+from hmmlearn.utils import fill_covars
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from tseries_patterns.common import stage
+from tseries_patterns.ml.hmm.HMM import HMM
+from tseries_patterns.ml.hmm.HMM3State import HMM3State
+from tseries_patterns.ml.hmm.EmissionEngine import EmissionEngine
+from tseries_patterns.ml.hmm.HMMKernels import viterbi, forward_backward, emissions, log_parameters, EMISSION_KINDS
+
+
+class HMMGridSearch:
+    """
+    Grid search over the hyperparameters (ss_prob, covar, means) of HMM2State / HMM3State style models.
+
+    The emission matrix depends only on (means, covar), hence is computed once per distinct pair and reused
+    across all ss_prob values.  Each (means, covar) pair is evaluated in a process pool, with the series
+    shared between workers in shared memory.
+
+    Emissions are taken from the model constructed for each pair: univariate GaussianHMM models (such as
+    HMM2State and HMM3State) use their means and covariances, and HMM models their distribution functions.
+    Other models (such as multivariate GaussianHMM) are not supported and raise an exception.  The model's
+    emissions must not depend on ss_prob.
+    """
+
+    def __init__(
+        self,
+        model = HMM3State,
+        ss_probs = (0.99, 0.995, 0.999),
+        covars = (0.1, 0.25, 0.5),
+        means = ([-0.7, 0.0, 0.7],),
+        scoring = "loglik",
+        processes: int = None):
+        """
+        :param model: model class (or function) constructed as model(covar=, means=, ss_prob=), such as HMM2State or HMM3State,
+               yielding a univariate GaussianHMM or an HMM
+        :param ss_probs: same-state probabilities to search
+        :param covars: variances to search
+        :param means: mean vectors to search (one mean per state)
+        :param scoring: "loglik" (log-likelihood of the series), "agreement" (fraction of decoded states
+               matching given labels), or a picklable function of (states, x, labels) yielding a score
+        :param processes: number of worker processes (default: # of cores)
+        """
+        self.model = model
+        self.ss_probs = list(ss_probs)
+        self.covars = list(covars)
+        self.means = [list(m) for m in means]
+        self.scoring = scoring
+        self.processes = processes
+
+
+    def search (self, x, labels = None) -> pd.DataFrame:
+        """
+        Evaluate all combinations of the grid on a series
+
+        :param x: series of observations
+        :param labels: (optional) reference states, required for "agreement" scoring
+        :return: dataframe of means, covar, ss_prob, and score, ranked best first
+        """
+        x = np.ascontiguousarray(getattr(x, "values", x), dtype=np.double).reshape(-1)
+        if self.scoring == "agreement" and labels is None:
+            raise Exception ("agreement scoring requires labels")
+        if labels is not None:
+            labels = np.asarray(getattr(labels, "values", labels)).reshape(-1)
+            if labels.shape[0] != x.shape[0]:
+                raise Exception ("labels must have same length as series")
+
+        n = x.shape[0]
+        with stage ("HMMGridSearch.search", n * len(self.means) * len(self.covars) * len(self.ss_probs)):
+            shm = shared_memory.SharedMemory(create=True, size=max(1, n * 8))
+            try:
+                block = np.ndarray((n,), dtype=np.double, buffer=shm.buf)
+                block[:] = x
+                del block
+
+                jobs = [
+                    (self.model, means, covar, self.ss_probs, self.scoring, labels, shm.name, n)
+                    for means, covar in itertools.product(self.means, self.covars)]
+
+                with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                    rows = [row for rows in pool.map(_grid_worker, jobs) for row in rows]
+            finally:
+                shm.close()
+                shm.unlink()
+
+        results = pd.DataFrame(rows, columns=["means", "covar", "ss_prob", "score"])
+        return results.sort_values("score", ascending=False, kind="stable").reset_index(drop=True)
+
+
+##
+## External function evaluating all ss_prob values of one (means, covar) pair on a core
+##
+def _grid_worker (job):
+    model, means, covar, ss_probs, scoring, labels, name, n = job
+    shm = shared_memory.SharedMemory(name=name)
+    x = np.ndarray((n,), dtype=np.double, buffer=shm.buf)
+    x.flags.writeable = False
+    try:
+        # emissions shared by every ss_prob
+        E = _emissions(model(covar=covar, means=means, ss_prob=ss_probs[0]), x)
+
+        rows = []
+        for ss_prob in ss_probs:
+            hmm = model(covar=covar, means=means, ss_prob=ss_prob)
+            logpi, logA = log_parameters(hmm.startprob_, hmm.transmat_)
+
+            if scoring == "loglik":
+                score, _, _ = forward_backward(E, logpi, logA)
+            else:
+                _, states = viterbi(E, logpi, logA)
+                if scoring == "agreement":
+                    score = float(np.mean(states == labels))
+                else:
+                    score = scoring(states, x, labels)
+
+            rows.append((tuple(means), covar, ss_prob, score))
+    finally:
+        del x
+        shm.close()
+
+    return rows
+
+
+def _emissions (hmm, x: np.ndarray) -> np.ndarray:
+    """
+    Emission log-densities of the states of a univariate GaussianHMM or an HMM
+    """
+    if isinstance(hmm, HMM):
+        return EmissionEngine(hmm.distributions).evaluate(x)
+
+    K = hmm.n_components
+    means = np.asarray(getattr(hmm, "means_", None), dtype=np.double)
+    if not isinstance(hmm, hmmlearn.hmm.GaussianHMM) or means.shape != (K, 1):
+        raise Exception ("grid search requires a univariate gaussian HMM or an HMM with distribution functions, got %s" % type(hmm).__name__)
+
+    covars = fill_covars(hmm._covars_, hmm.covariance_type, K, 1)
+    kinds = np.full(K, EMISSION_KINDS["normal"], dtype=np.int32)
+    params = np.zeros((K, 3))
+    params[:,0] = means[:,0]
+    params[:,1] = np.sqrt(covars[:,0,0])
+    return emissions(x, kinds, params, np.empty((x.shape[0], K)))
+
+
+##
+##  UNIT TESTS
+##
+
+def _laplace_model (covar, means, ss_prob):
+    from tseries_patterns.math.distributions import LaplaceDistribution
+    K = len(means)
+    A = np.full((K, K), (1.0 - ss_prob) / (K - 1))
+    np.fill_diagonal(A, ss_prob)
+    return HMM([LaplaceDistribution(mu, np.sqrt(covar / 2)).logf for mu in means], A, np.full(K, 1.0 / K))
+
+
+def _multivariate_model (covar, means, ss_prob):
+    from tseries_patterns.ml.hmm.GaussianHMM import GaussianHMM
+    A = np.array([[ss_prob, 1 - ss_prob], [1 - ss_prob, ss_prob]])
+    return GaussianHMM(A, np.array([[m, m] for m in means]), np.array([0.5, 0.5]), np.tile(covar * np.eye(2), [2, 1, 1]))
+
+
+class TestHMMGridSearch(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self._x = pd.Series(np.repeat(rng.choice([-0.7, 0.0, 0.7], 40), 50) + rng.normal(0.0, 0.5, 2000))
+
+
+    def _check(self, search, model):
+        results = search.search (self._x)
+        self.assertEqual (len(results), len(search.means) * len(search.covars) * len(search.ss_probs))
+        self.assertTrue (np.all (np.diff(results["score"].values) <= 0))
+
+        x = self._x.values.reshape(-1, 1)
+        for means, covar, ss_prob, score in results.itertuples(index=False):
+            hmm = model(covar=covar, means=list(means), ss_prob=ss_prob)
+            self.assertAlmostEqual (score, hmm.score(x), delta=1e-8 * abs(score))
+
+
+    def test_gaussian(self):
+        from tseries_patterns.ml.hmm.HMM2State import HMM2State
+        self._check (HMMGridSearch (HMM3State, ss_probs=(0.9, 0.99), covars=(0.1, 0.25)), HMM3State)
+        self._check (HMMGridSearch (HMM2State, ss_probs=(0.99,), covars=(0.25,), means=([-0.5, 0.5],), processes=1), HMM2State)
+
+
+    def test_model(self):
+        search = HMMGridSearch (_laplace_model, ss_probs=(0.9, 0.99), covars=(0.1, 0.25), means=([-0.7, 0.0, 0.7],), processes=2)
+        self._check (search, _laplace_model)
+
+        search = HMMGridSearch (_multivariate_model, means=([-0.5, 0.5],), processes=1)
+        self.assertRaises (Exception, search.search, self._x)
+
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,817 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# cython: boundscheck=False, wraparound=False, cdivision=True
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from libc.math cimport exp, log, fabs, INFINITY
+from libc.stdint cimport int8_t, int64_t
+
+#
+#   Compiled decoding kernels for small-state HMMs, operating on a precomputed (n, K) emission log-probability
+#   matrix.  State vectors are held in fixed-size stack arrays and all loops run without the GIL.
+#
+
+cdef enum:
+    MAX_STATES = 64
+
+ctypedef fused state_t:
+    int8_t
+    int64_t
+
+
+def viterbi (logprob, log_startprob, log_transmat, out = None):
+    """
+    Log-space viterbi decoding
+
+    :param logprob: (n, K) matrix of emission log-probabilities
+    :param log_startprob: log prior probability of each state
+    :param log_transmat: (K, K) log transition matrix
+    :param out: (optional) preallocated int8 or int64 state vector of length n, written in place
+    :return: tuple of log-probability of the most likely path and the state path
+    """
+    cdef const double[:,::1] lp = _matrix(logprob)
+    cdef const double[::1] pi = np.ascontiguousarray(log_startprob, dtype=np.double)
+    cdef const double[:,::1] A = np.ascontiguousarray(log_transmat, dtype=np.double)
+    cdef int8_t[:,::1] bp
+    cdef int8_t[:] o8
+    cdef int64_t[:] o64
+
+    n = lp.shape[0]
+    _check(lp, pi, A)
+    out = _states(out, n)
+
+    if n == 0:
+        return -INFINITY, out
+
+    bp = np.empty((n, lp.shape[1]), dtype=np.int8)
+    if out.dtype == np.int8:
+        o8 = out
+        logp = _viterbi (lp, pi, A, bp, o8)
+    else:
+        o64 = out
+        logp = _viterbi (lp, pi, A, bp, o64)
+
+    return logp, out
+
+
+def viterbi_sparse (logprob, log_startprob, transitions, out = None):
+    """
+    Log-space viterbi decoding with sparse transitions, iterating only the allowed transitions into each state:
+    O(n nnz) rather than O(n K^2).  Yields the same path as viterbi() on the equivalent dense matrix.
+
+    :param logprob: (n, K) matrix of emission log-probabilities
+    :param log_startprob: log prior probability of each state
+    :param transitions: SparseTransitions (allowed transitions grouped by target state)
+    :param out: (optional) preallocated int8 or int64 state vector of length n, written in place
+    :return: tuple of log-probability of the most likely path and the state path
+    """
+    cdef const double[:,::1] lp = _matrix(logprob)
+    cdef const double[::1] pi = np.ascontiguousarray(log_startprob, dtype=np.double)
+    cdef const int[::1] indptr = np.ascontiguousarray(transitions.indptr, dtype=np.int32)
+    cdef const int[::1] sources = np.ascontiguousarray(transitions.sources, dtype=np.int32)
+    cdef const double[::1] logv = np.ascontiguousarray(transitions.logvalues, dtype=np.double)
+    cdef int8_t[:,::1] bp
+    cdef int8_t[:] o8
+    cdef int64_t[:] o64
+
+    n = lp.shape[0]
+    K = lp.shape[1]
+    if K < 1 or K > MAX_STATES:
+        raise Exception ("number of states must be in [1, %d], got %d" % (MAX_STATES, K))
+    if pi.shape[0] != K or indptr.shape[0] != K + 1:
+        raise Exception ("state probabilities and transitions must match %d states" % K)
+    out = _states(out, n)
+
+    if n == 0:
+        return -INFINITY, out
+
+    bp = np.empty((n, K), dtype=np.int8)
+    if out.dtype == np.int8:
+        o8 = out
+        logp = _viterbi_sparse (lp, pi, indptr, sources, logv, bp, o8)
+    else:
+        o64 = out
+        logp = _viterbi_sparse (lp, pi, indptr, sources, logv, bp, o64)
+
+    return logp, out
+
+
+def viterbi_checkpointed (emit, n, log_startprob, log_transmat, out = None, segment = None):
+    """
+    Memory-bounded viterbi decoding.  A forward pass keeps only the viterbi vector at the end of each segment
+    of `segment` (default sqrt(n)) observations; a backward pass over segments recomputes each segment's
+    recursion from its checkpoint, storing int8 backpointers for that segment only.  Emissions are requested
+    a segment at a time (twice).  Working state is O(sqrt(n) K) and the path equals that of viterbi().
+
+    :param emit: function of (start, end) yielding the (end - start, K) emission log-probabilities of those rows
+    :param n: number of observations
+    :param log_startprob: log prior probability of each state
+    :param log_transmat: (K, K) log transition matrix
+    :param out: (optional) preallocated int8 or int64 state vector of length n (default int8), written in place
+    :param segment: (optional) segment length
+    :return: tuple of log-probability of the most likely path and the state path
+    """
+    cdef const double[::1] pi = np.ascontiguousarray(log_startprob, dtype=np.double)
+    cdef const double[:,::1] A = np.ascontiguousarray(log_transmat, dtype=np.double)
+    cdef const double[:,::1] lp
+    cdef double[:,::1] checkpoints
+    cdef double[::1] delta
+    cdef int8_t[:,::1] bp
+    cdef int8_t[:] o8
+    cdef int64_t[:] o64
+    cdef Py_ssize_t K = pi.shape[0]
+    cdef Py_ssize_t L, nseg, si, start, end, state
+
+    if out is None:
+        out = np.empty(n, dtype=np.int8)
+    out = _states(out, n)
+    if n == 0:
+        return -INFINITY, out
+
+    L = max(1, int(segment or np.ceil(np.sqrt(n))))
+    nseg = (n + L - 1) // L
+    checkpoints = np.empty((nseg, K))
+    delta = np.empty(K)
+
+    # forward pass: checkpoints[si] is the viterbi vector entering segment si
+    for si in range(nseg):
+        start = si * L
+        end = min(n, start + L)
+        lp = _segment(emit, start, end, K)
+        _check(lp, pi, A)
+        if si > 0:
+            checkpoints[si,:] = delta
+        _viterbi_advance (lp, pi, A, checkpoints[si], si == 0, delta, None)
+
+    logp = delta[_argmax(delta)]
+
+    # backward pass: recompute each segment from its checkpoint and backtrack through it
+    bp = np.empty((L, K), dtype=np.int8)
+    state = -1
+    for si in range(nseg - 1, -1, -1):
+        start = si * L
+        end = min(n, start + L)
+        lp = _segment(emit, start, end, K)
+        _viterbi_advance (lp, pi, A, checkpoints[si], si == 0, delta, bp)
+        if state < 0:
+            state = _argmax(delta)
+
+        if out.dtype == np.int8:
+            o8 = out
+            state = _backtrack (bp, state, o8[start:end])
+        else:
+            o64 = out
+            state = _backtrack (bp, state, o64[start:end])
+
+    return logp, out
+
+
+def viterbi_batch (logprob, lengths, log_startprob, log_transmat, threads = None):
+    """
+    Viterbi decoding of a batch of series, the series divided across threads running the recursion without
+    the GIL
+
+    :param logprob: (N, K) matrix of emission log-probabilities of the concatenated series
+    :param lengths: length of each series
+    :param log_startprob: log prior probability of each state
+    :param log_transmat: (K, K) log transition matrix
+    :param threads: number of threads (default: # of cores)
+    :return: int8 (series x time) state matrix, padded with -1 beyond the end of shorter series
+    """
+    cdef const double[:,::1] lp = _matrix(logprob)
+    cdef const double[::1] pi = np.ascontiguousarray(log_startprob, dtype=np.double)
+    cdef const double[:,::1] A = np.ascontiguousarray(log_transmat, dtype=np.double)
+
+    _check(lp, pi, A)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    total = int(lengths.sum())
+    if total != lp.shape[0]:
+        raise Exception ("lengths sum to %d, but have %d observations" % (total, lp.shape[0]))
+
+    m = lengths.shape[0]
+    out = np.full((m, lengths.max() if m > 0 else 0), -1, dtype=np.int8)
+    bp = np.empty((lp.shape[0], lp.shape[1]), dtype=np.int8)
+
+    # divide series into contiguous ranges of roughly equal # of observations
+    threads = max(1, min(threads or os.cpu_count() or 1, m))
+    cuts = np.searchsorted(offsets, np.linspace(0, total, threads + 1)[1:threads])
+    bounds = np.unique(np.concatenate(([0], cuts, [m])))
+
+    if bounds.shape[0] == 2:
+        _viterbi_range (lp, pi, A, bp, offsets, out, 0, m)
+    else:
+        with ThreadPoolExecutor(max_workers=bounds.shape[0] - 1) as pool:
+            futures = [
+                pool.submit(_viterbi_range, lp, pi, A, bp, offsets, out, bounds[i], bounds[i+1])
+                for i in range(bounds.shape[0] - 1)]
+            for future in futures:
+                future.result()
+
+    return out
+
+
+def forward_backward (logprob, log_startprob, log_transmat):
+    """
+    Scaled forward-backward pass
+
+    :param logprob: (n, K) matrix of emission log-probabilities
+    :param log_startprob: log prior probability of each state
+    :param log_transmat: (K, K) log transition matrix
+    :return: tuple of log-likelihood, (n, K) state posteriors, and (K, K) expected transition counts; where the
+             observations have zero probability under the model (every state impossible at some observation),
+             the log-likelihood is -inf and the posteriors and counts are zero
+    """
+    cdef const double[:,::1] lp = _matrix(logprob)
+    cdef const double[::1] pi = np.ascontiguousarray(log_startprob, dtype=np.double)
+    cdef const double[:,::1] A = np.ascontiguousarray(log_transmat, dtype=np.double)
+
+    n = lp.shape[0]
+    K = lp.shape[1]
+    _check(lp, pi, A)
+
+    posteriors = np.zeros((n, K))
+    xi = np.zeros((K, K))
+    if n == 0:
+        return 0.0, posteriors, xi
+
+    b = np.empty((n, K))
+    c = np.empty(n)
+    loglik = _forward_backward (lp, pi, A, posteriors, b, c, xi)
+    if loglik == -INFINITY:
+        posteriors[:] = 0.0
+    return loglik, posteriors, xi
+
+
+def walkforward (logprob, log_startprob, log_transmat, window, out = None):
+    """
+    Last state of the viterbi path over the trailing window ending at each observation (see WalkforwardDecoder),
+    or with window = None, of the viterbi recursion from the start of the series.
+
+    :param logprob: (n, K) matrix of emission log-probabilities
+    :param log_startprob: log prior probability of each state
+    :param log_transmat: (K, K) log transition matrix
+    :param window: trailing window length or None
+    :param out: (optional) preallocated int8 or int64 state vector of length n, written in place
+    :return: tuple of state vector and final (max-normalized) viterbi vector for unbounded decoding (otherwise None)
+    """
+    cdef const double[:,::1] lp = _matrix(logprob)
+    cdef const double[::1] pi = np.ascontiguousarray(log_startprob, dtype=np.double)
+    cdef const double[:,::1] A = np.ascontiguousarray(log_transmat, dtype=np.double)
+    cdef double[::1] delta
+    cdef double[:,::1] front
+    cdef Py_ssize_t w
+    cdef int8_t[:] o8
+    cdef int64_t[:] o64
+
+    n = lp.shape[0]
+    K = lp.shape[1]
+    _check(lp, pi, A)
+    out = _states(out, n)
+    if n == 0:
+        return out, None
+
+    if window is None:
+        delta = np.empty(K)
+        if out.dtype == np.int8:
+            o8 = out
+            _online (lp, pi, A, delta, o8)
+        else:
+            o64 = out
+            _online (lp, pi, A, delta, o64)
+        return out, np.asarray(delta)
+
+    if window < 1:
+        raise Exception ("window must be at least 1")
+
+    w = min(window, n)
+    front = np.empty((w, K))
+    if out.dtype == np.int8:
+        o8 = out
+        _windowed (lp, pi, A, w, front, o8)
+    else:
+        o64 = out
+        _windowed (lp, pi, A, w, front, o64)
+    return out, None
+
+
+def log_parameters (startprob, transmat):
+    """
+    Log of state prior and transition probabilities (zero probabilities mapping to -inf)
+
+    :return: tuple of log prior and log transition matrix
+    """
+    with np.errstate(divide='ignore'):
+        return np.log(np.asarray(startprob, dtype=np.double)), np.log(np.asarray(transmat, dtype=np.double))
+
+
+#
+#   Implementation
+#
+
+def _matrix (logprob):
+    lp = np.ascontiguousarray(logprob, dtype=np.double)
+    if lp.ndim != 2:
+        raise Exception ("emission log-probabilities must be an (n, K) matrix")
+    return lp
+
+
+def flatten_batch (X, lengths = None):
+    """
+    Concatenate a batch of series
+
+    :param X: (series x time) matrix, list of series, or concatenated vector of series (with lengths)
+    :param lengths: (optional) lengths of the series where X is a concatenated vector
+    :return: tuple of concatenated float64 vector and series lengths
+    """
+    if lengths is not None:
+        x = np.ascontiguousarray(X, dtype=np.double).reshape(-1)
+        lengths = np.asarray(lengths, dtype=np.int64)
+    elif isinstance(X, np.ndarray) and X.ndim == 2:
+        x = np.ascontiguousarray(X, dtype=np.double).reshape(-1)
+        lengths = np.full(X.shape[0], X.shape[1], dtype=np.int64)
+    else:
+        series = [np.asarray(getattr(s, "values", s), dtype=np.double).reshape(-1) for s in X]
+        x = np.concatenate(series) if len(series) > 0 else np.empty(0)
+        lengths = np.array([s.shape[0] for s in series], dtype=np.int64)
+
+    if lengths.sum() != x.shape[0]:
+        raise Exception ("lengths sum to %d, but have %d observations" % (lengths.sum(), x.shape[0]))
+    return x, lengths
+
+
+def _check (const double[:,::1] lp, const double[::1] pi, const double[:,::1] A):
+    K = lp.shape[1]
+    if K < 1 or K > MAX_STATES:
+        raise Exception ("number of states must be in [1, %d], got %d" % (MAX_STATES, K))
+    if pi.shape[0] != K or A.shape[0] != K or A.shape[1] != K:
+        raise Exception ("state probabilities and transition matrix must match %d states" % K)
+
+
+def _states (out, n):
+    if out is None:
+        return np.empty(n, dtype=np.int64)
+    if out.shape[0] != n:
+        raise Exception ("out must have length %d, got %d" % (n, out.shape[0]))
+    if out.dtype != np.int8 and out.dtype != np.int64:
+        raise Exception ("out must be int8 or int64, got %s" % out.dtype)
+    return out
+
+
+cdef double _viterbi (const double[:,::1] lp, const double[::1] pi, const double[:,::1] A, int8_t[:,::1] bp, state_t[:] out) noexcept nogil:
+    cdef Py_ssize_t n = lp.shape[0]
+    cdef Py_ssize_t K = lp.shape[1]
+    cdef double prev[MAX_STATES]
+    cdef double cur[MAX_STATES]
+    cdef Py_ssize_t t, i, j, best
+    cdef double v, vmax
+
+    for j in range(K):
+        prev[j] = pi[j] + lp[0,j]
+
+    for t in range(1, n):
+        for j in range(K):
+            best = 0
+            vmax = prev[0] + A[0,j]
+            for i in range(1, K):
+                v = prev[i] + A[i,j]
+                if v > vmax:
+                    vmax = v
+                    best = i
+            cur[j] = vmax + lp[t,j]
+            bp[t,j] = <int8_t> best
+        for j in range(K):
+            prev[j] = cur[j]
+
+    best = 0
+    for j in range(1, K):
+        if prev[j] > prev[best]:
+            best = j
+
+    out[n-1] = <state_t> best
+    for t in range(n-1, 0, -1):
+        best = bp[t,best]
+        out[t-1] = <state_t> best
+
+    return prev[out[n-1]]
+
+
+def _segment (emit, start, end, K):
+    lp = _matrix(emit(start, end))
+    if lp.shape[0] != end - start or lp.shape[1] != K:
+        raise Exception ("emissions for rows [%d, %d) must have shape (%d, %d)" % (start, end, end - start, K))
+    return lp
+
+
+cdef Py_ssize_t _argmax (double[::1] v) noexcept nogil:
+    cdef Py_ssize_t j, best = 0
+    for j in range(1, v.shape[0]):
+        if v[j] > v[best]:
+            best = j
+    return best
+
+
+cdef void _viterbi_advance (
+        const double[:,::1] lp, const double[::1] pi, const double[:,::1] A, const double[::1] entry, bint first,
+        double[::1] delta, int8_t[:,::1] bp) noexcept nogil:
+    """
+    Advance viterbi vector across a segment, from `entry` (or the prior if first), optionally recording backpointers
+    """
+    cdef Py_ssize_t n = lp.shape[0]
+    cdef Py_ssize_t K = lp.shape[1]
+    cdef double prev[MAX_STATES]
+    cdef double cur[MAX_STATES]
+    cdef Py_ssize_t t, i, j, best, t0
+    cdef double v, vmax
+
+    if first:
+        for j in range(K):
+            prev[j] = pi[j] + lp[0,j]
+        t0 = 1
+    else:
+        for j in range(K):
+            prev[j] = entry[j]
+        t0 = 0
+
+    for t in range(t0, n):
+        for j in range(K):
+            best = 0
+            vmax = prev[0] + A[0,j]
+            for i in range(1, K):
+                v = prev[i] + A[i,j]
+                if v > vmax:
+                    vmax = v
+                    best = i
+            cur[j] = vmax + lp[t,j]
+            if bp is not None:
+                bp[t,j] = <int8_t> best
+        for j in range(K):
+            prev[j] = cur[j]
+
+    for j in range(K):
+        delta[j] = prev[j]
+
+
+cdef Py_ssize_t _backtrack (int8_t[:,::1] bp, Py_ssize_t state, state_t[:] out) noexcept nogil:
+    """
+    Backtrack through a segment ending in `state`, returning the state preceding the segment
+    """
+    cdef Py_ssize_t t
+    cdef Py_ssize_t n = out.shape[0]
+    for t in range(n-1, -1, -1):
+        out[t] = <state_t> state
+        state = bp[t,state]
+    return state
+
+
+def _viterbi_range (
+        const double[:,::1] lp, const double[::1] pi, const double[:,::1] A, int8_t[:,::1] bp,
+        int64_t[::1] offsets, int8_t[:,::1] out, Py_ssize_t i0, Py_ssize_t i1):
+    cdef Py_ssize_t i
+    cdef const double[:,::1] lpi
+    cdef int8_t[:,::1] bpi
+    cdef int8_t[:] outi
+    with nogil:
+        for i in range(i0, i1):
+            if offsets[i+1] > offsets[i]:
+                lpi = lp[offsets[i]:offsets[i+1]]
+                bpi = bp[offsets[i]:offsets[i+1]]
+                outi = out[i,:offsets[i+1] - offsets[i]]
+                _viterbi (lpi, pi, A, bpi, outi)
+
+
+cdef double _viterbi_sparse (
+        const double[:,::1] lp, const double[::1] pi, const int[::1] indptr, const int[::1] sources, const double[::1] logv,
+        int8_t[:,::1] bp, state_t[:] out) noexcept nogil:
+    cdef Py_ssize_t n = lp.shape[0]
+    cdef Py_ssize_t K = lp.shape[1]
+    cdef double prev[MAX_STATES]
+    cdef double cur[MAX_STATES]
+    cdef Py_ssize_t t, i, j, k, best
+    cdef double v, vmax
+
+    for j in range(K):
+        prev[j] = pi[j] + lp[0,j]
+
+    for t in range(1, n):
+        for j in range(K):
+            best = 0
+            vmax = -INFINITY
+            for k in range(indptr[j], indptr[j+1]):
+                i = sources[k]
+                v = prev[i] + logv[k]
+                if v > vmax:
+                    vmax = v
+                    best = i
+            cur[j] = vmax + lp[t,j]
+            bp[t,j] = <int8_t> best
+        for j in range(K):
+            prev[j] = cur[j]
+
+    best = 0
+    for j in range(1, K):
+        if prev[j] > prev[best]:
+            best = j
+
+    out[n-1] = <state_t> best
+    for t in range(n-1, 0, -1):
+        best = bp[t,best]
+        out[t-1] = <state_t> best
+
+    return prev[out[n-1]]
+
+
+cdef double _forward_backward (
+        const double[:,::1] lp, const double[::1] logpi, const double[:,::1] logA,
+        double[:,::1] post, double[:,::1] b, double[::1] c, double[:,::1] xi) noexcept nogil:
+    cdef Py_ssize_t n = lp.shape[0]
+    cdef Py_ssize_t K = lp.shape[1]
+    cdef double A[MAX_STATES * MAX_STATES]
+    cdef double beta[MAX_STATES]
+    cdef double nbeta[MAX_STATES]
+    cdef Py_ssize_t t, i, j
+    cdef double m, s, v, loglik = 0.0
+
+    for i in range(K):
+        for j in range(K):
+            A[i*K + j] = exp(logA[i,j])
+
+    # scaled emission probabilities
+    for t in range(n):
+        m = lp[t,0]
+        for j in range(1, K):
+            if lp[t,j] > m:
+                m = lp[t,j]
+        for j in range(K):
+            b[t,j] = exp(lp[t,j] - m)
+        loglik += m
+
+    # forward pass (normalized alpha held in posterior matrix)
+    for t in range(n):
+        s = 0.0
+        for j in range(K):
+            if t == 0:
+                v = exp(logpi[j])
+            else:
+                v = 0.0
+                for i in range(K):
+                    v += post[t-1,i] * A[i*K + j]
+            post[t,j] = v * b[t,j]
+            s += post[t,j]
+
+        # zero probability (or all states impossible) at t: sequence is impossible under the model
+        if not s > 0:
+            return -INFINITY
+
+        c[t] = s
+        loglik += log(s)
+        for j in range(K):
+            post[t,j] /= s
+
+    # backward pass, combining into posteriors and transition counts
+    for i in range(K):
+        beta[i] = 1.0
+    for t in range(n-2, -1, -1):
+        for i in range(K):
+            v = 0.0
+            for j in range(K):
+                s = A[i*K + j] * b[t+1,j] * beta[j] / c[t+1]
+                v += s
+                xi[i,j] += post[t,i] * s
+            nbeta[i] = v
+        for i in range(K):
+            post[t+1,i] *= beta[i]
+            beta[i] = nbeta[i]
+    for i in range(K):
+        post[0,i] *= beta[i]
+
+    return loglik
+
+
+cdef void _online (const double[:,::1] lp, const double[::1] pi, const double[:,::1] A, double[::1] delta, state_t[:] out) noexcept nogil:
+    cdef Py_ssize_t n = lp.shape[0]
+    cdef Py_ssize_t K = lp.shape[1]
+    cdef double prev[MAX_STATES]
+    cdef double cur[MAX_STATES]
+    cdef Py_ssize_t t, i, j, best
+    cdef double v, vmax
+
+    for j in range(K):
+        cur[j] = pi[j] + lp[0,j]
+
+    for t in range(n):
+        if t > 0:
+            for j in range(K):
+                vmax = prev[0] + A[0,j]
+                for i in range(1, K):
+                    v = prev[i] + A[i,j]
+                    if v > vmax:
+                        vmax = v
+                cur[j] = vmax + lp[t,j]
+
+        best = 0
+        for j in range(1, K):
+            if cur[j] > cur[best]:
+                best = j
+        out[t] = <state_t> best
+
+        # renormalize to keep values bounded (argmax is unaffected)
+        vmax = cur[best]
+        for j in range(K):
+            prev[j] = cur[j] - vmax
+
+    for j in range(K):
+        delta[j] = prev[j]
+
+
+cdef void _windowed (
+        const double[:,::1] lp, const double[::1] pi, const double[:,::1] A, Py_ssize_t w,
+        double[:,::1] front, state_t[:] out) noexcept nogil:
+    cdef Py_ssize_t n = lp.shape[0]
+    cdef Py_ssize_t K = lp.shape[1]
+    cdef double back[MAX_STATES * MAX_STATES]
+    cdef double P[MAX_STATES * MAX_STATES]
+    cdef double M[MAX_STATES * MAX_STATES]
+    cdef double tmp[MAX_STATES * MAX_STATES]
+    cdef double v[MAX_STATES]
+    cdef Py_ssize_t t, s, i, j, k, r, best
+    cdef Py_ssize_t m = -1, front_start = 0
+    cdef bint have_back = False
+    cdef bint have_P
+    cdef double x, vmax
+
+    for t in range(n):
+        s = t - w + 1
+        if s < 0:
+            s = 0
+
+        if s > m:
+            # flip: rebuild front vectors for window starts [s, t] from suffix products, emptying the back stack
+            front_start = s
+            for j in range(K):
+                front[t-s,j] = pi[j] + lp[t,j]
+
+            have_P = False
+            for r in range(t-s-1, -1, -1):
+                for i in range(K):
+                    for j in range(K):
+                        M[i*K + j] = A[i,j] + lp[s+r+1,j]
+                if not have_P:
+                    for i in range(K*K):
+                        P[i] = M[i]
+                    have_P = True
+                else:
+                    _maxplus (M, P, tmp, K)
+                    for i in range(K*K):
+                        P[i] = tmp[i]
+                for j in range(K):
+                    vmax = pi[0] + lp[s+r,0] + P[j]
+                    for i in range(1, K):
+                        x = pi[i] + lp[s+r,i] + P[i*K + j]
+                        if x > vmax:
+                            vmax = x
+                    front[r,j] = vmax
+
+            m = t
+            have_back = False
+        else:
+            for i in range(K):
+                for j in range(K):
+                    M[i*K + j] = A[i,j] + lp[t,j]
+            if not have_back:
+                for i in range(K*K):
+                    back[i] = M[i]
+                have_back = True
+            else:
+                _maxplus (back, M, tmp, K)
+                for i in range(K*K):
+                    back[i] = tmp[i]
+
+        r = s - front_start
+        if have_back:
+            for j in range(K):
+                vmax = front[r,0] + back[j]
+                for i in range(1, K):
+                    x = front[r,i] + back[i*K + j]
+                    if x > vmax:
+                        vmax = x
+                v[j] = vmax
+        else:
+            for j in range(K):
+                v[j] = front[r,j]
+
+        best = 0
+        for j in range(1, K):
+            if v[j] > v[best]:
+                best = j
+        out[t] = <state_t> best
+
+
+cdef inline void _maxplus (double* X, double* Y, double* Z, Py_ssize_t K) noexcept nogil:
+    cdef Py_ssize_t i, j, k
+    cdef double x, vmax
+    for i in range(K):
+        for j in range(K):
+            vmax = X[i*K] + Y[j]
+            for k in range(1, K):
+                x = X[i*K + k] + Y[k*K + j]
+                if x > vmax:
+                    vmax = x
+            Z[i*K + j] = vmax
+
+
+#
+#   Emission log-densities
+#
+
+cdef enum:
+    EMIT_NORMAL = 0
+    EMIT_LAPLACE = 1
+    EMIT_EXPONENTIAL = 2
+
+EMISSION_KINDS = {"normal": EMIT_NORMAL, "laplace": EMIT_LAPLACE, "exponential": EMIT_EXPONENTIAL}
+
+
+def emissions (x, kinds, params, out):
+    """
+    Closed-form emission log-densities of all states in one pass over the observations.  States with a
+    negative kind are skipped (left to be filled by the caller).
+
+    :param x: vector of n observations
+    :param kinds: int32 vector of K distribution kinds (see EMISSION_KINDS)
+    :param params: (K, 3) matrix of distribution parameters: (mu, sigma), (mu, beta), or (base, decay, dir)
+    :param out: (n, K) matrix of log-densities, written in place
+    :return: out
+    """
+    cdef const double[:] xv = np.asarray(x, dtype=np.double)
+    cdef const int[::1] kv = np.ascontiguousarray(kinds, dtype=np.int32)
+    cdef const double[:,::1] pv = np.ascontiguousarray(params, dtype=np.double)
+    cdef double[:,::1] ov = out
+
+    if ov.shape[0] != xv.shape[0] or ov.shape[1] != kv.shape[0] or pv.shape[0] != kv.shape[0]:
+        raise Exception ("emission shapes do not agree")
+    if kv.shape[0] > MAX_STATES:
+        raise Exception ("number of states must be at most %d, got %d" % (MAX_STATES, kv.shape[0]))
+
+    _emissions (xv, kv, pv, ov)
+    return out
+
+
+cdef void _emissions (const double[:] x, const int[::1] kinds, const double[:,::1] params, double[:,::1] out) noexcept nogil:
+    cdef Py_ssize_t n = x.shape[0]
+    cdef Py_ssize_t K = kinds.shape[0]
+    cdef double a[MAX_STATES]
+    cdef double b[MAX_STATES]
+    cdef double c[MAX_STATES]
+    cdef Py_ssize_t t, j
+    cdef double z, xt
+
+    # per-state constants: location, scale, normalization
+    for j in range(K):
+        if kinds[j] == EMIT_NORMAL:
+            a[j] = params[j,0]
+            b[j] = 1.0 / params[j,1]
+            c[j] = -log(params[j,1]) - 0.9189385332046727
+        elif kinds[j] == EMIT_LAPLACE:
+            a[j] = params[j,0]
+            b[j] = 1.0 / params[j,1]
+            c[j] = -log(2.0 * params[j,1])
+        elif kinds[j] == EMIT_EXPONENTIAL:
+            a[j] = params[j,0]
+            b[j] = params[j,1] * params[j,2]
+            c[j] = log(params[j,1])
+
+    for t in range(n):
+        xt = x[t]
+        for j in range(K):
+            if kinds[j] == EMIT_NORMAL:
+                z = (xt - a[j]) * b[j]
+                out[t,j] = c[j] - 0.5 * z * z
+            elif kinds[j] == EMIT_LAPLACE:
+                out[t,j] = c[j] - fabs(xt - a[j]) * b[j]
+            elif kinds[j] == EMIT_EXPONENTIAL:
+                out[t,j] = c[j] - b[j] * (xt - a[j])
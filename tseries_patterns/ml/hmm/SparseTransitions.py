@@ -0,0 +1,177 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import sys
+import unittest
+from unittest import mock
+import numpy as np
+
+# decode with the sparse kernel where at most this fraction of transitions are allowed
+SPARSE_DENSITY = 0.5
+
+
+class SparseTransitions:
+    """
+    Transition matrix in sparse form, holding only the allowed (nonzero) transitions, grouped by target state
+    (compressed sparse column).  Decoding with a sparse transition matrix iterates only allowed transitions,
+    costing O(n nnz) rather than O(n K^2).
+    """
+
+    def __init__(self, transition_matrix):
+        """
+        :param transition_matrix: (K, K) transition probabilities, dense or scipy.sparse; zero entries are disallowed
+        """
+        A = transition_matrix.toarray() if hasattr(transition_matrix, "toarray") else transition_matrix
+        A = np.asarray(A, dtype=np.double)
+        if A.ndim != 2 or A.shape[0] != A.shape[1]:
+            raise Exception ("transition matrix must be square, got shape %s" % (A.shape,))
+
+        self.nstates = A.shape[0]
+        targets, sources = np.nonzero(A.T)
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(targets, minlength=self.nstates)))).astype(np.int32)
+        self.sources = sources.astype(np.int32)
+        self.logvalues = np.log(A.T[targets, sources])
+
+
+    @staticmethod
+    def banded (nstates: int, ss_prob: float, width: int = 1):
+        """
+        Banded transition matrix: remain in state with probability ss_prob, otherwise move to one of the states
+        within `width` of the current state with equal probability
+
+        :param nstates: number of states
+        :param ss_prob: same-state probability
+        :param width: maximum jump in state index
+        :return: sparse transitions
+        """
+        A = np.zeros((nstates, nstates))
+        for i in range(nstates):
+            lo = max(0, i - width)
+            hi = min(nstates, i + width + 1)
+            if hi - lo > 1:
+                A[i,lo:hi] = (1 - ss_prob) / (hi - lo - 1)
+                A[i,i] = ss_prob
+            else:
+                A[i,i] = 1.0
+        return SparseTransitions(A)
+
+
+    @property
+    def nnz (self) -> int:
+        """
+        Number of allowed transitions
+        """
+        return self.sources.shape[0]
+
+    @property
+    def density (self) -> float:
+        """
+        Fraction of allowed transitions
+        """
+        return self.nnz / float(self.nstates * self.nstates)
+
+
+    def toDense (self) -> np.ndarray:
+        """
+        Dense transition probability matrix
+        """
+        A = np.zeros((self.nstates, self.nstates))
+        for j in range(self.nstates):
+            I = slice(self.indptr[j], self.indptr[j+1])
+            A[self.sources[I], j] = np.exp(self.logvalues[I])
+        return A
+
+
+def dense (transition_matrix):
+    """
+    Dense form of a transition matrix given as SparseTransitions, scipy.sparse, or dense matrix (None passes through)
+    """
+    if isinstance(transition_matrix, SparseTransitions):
+        return transition_matrix.toDense()
+    elif hasattr(transition_matrix, "toarray"):
+        return transition_matrix.toarray()
+    else:
+        return transition_matrix
+
+
+##
+##  UNIT TESTS
+##
+
+class TestSparseTransitions(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self._banded = SparseTransitions.banded (9, 0.9)
+        self._E = np.log(rng.random((2000, 9)))
+        self._logpi = np.log(np.full(9, 1.0 / 9))
+
+
+    def test_banded(self):
+        A = self._banded.toDense()
+        self.assertTrue (np.allclose (A.sum(axis=1), 1.0))
+        self.assertEqual (self._banded.nnz, 9 + 2 * 8)
+        self.assertLessEqual (self._banded.density, SPARSE_DENSITY)
+        self.assertTrue (np.array_equal (SparseTransitions(A).toDense(), A))
+
+        import scipy.sparse
+        self.assertTrue (np.array_equal (SparseTransitions(scipy.sparse.csr_matrix(A)).indptr, self._banded.indptr))
+
+
+    def test_viterbi(self):
+        from tseries_patterns.ml.hmm.HMMKernels import viterbi, viterbi_sparse
+
+        ## sparse path equals dense path
+        with np.errstate(divide='ignore'):
+            logA = np.log(self._banded.toDense())
+        logp, states = viterbi (self._E, self._logpi, logA)
+        slogp, sstates = viterbi_sparse (self._E, self._logpi, self._banded)
+
+        self.assertTrue (np.array_equal (sstates, states))
+        self.assertAlmostEqual (slogp, logp, delta=1e-9 * abs(logp))
+        self.assertTrue (np.all (np.abs(np.diff(states)) <= 1))
+
+
+    def test_switch(self):
+        from tseries_patterns.ml.hmm.HMMKernels import viterbi_sparse
+        from tseries_patterns.math.distributions import NormalDistribution
+        from tseries_patterns.ml.hmm import HMM
+
+        ## HMM decodes with the sparse kernel only at or below SPARSE_DENSITY, with the same result
+        module = sys.modules[HMM.__module__]
+        x = np.random.default_rng(2).normal(0.0, 3.0, 1000)
+        dists = [NormalDistribution(mu, 1.0).logf for mu in range(-4, 5)]
+
+        for transitions, sparse in [(self._banded.toDense(), True), (np.full((9, 9), 1.0 / 9), False)]:
+            hmm = HMM (dists, transitions, np.full(9, 1.0 / 9))
+            with mock.patch.object (module, "viterbi_sparse", wraps=viterbi_sparse) as kernel:
+                states = hmm.predict (x)
+            self.assertEqual (kernel.called, sparse)
+            self.assertTrue (np.array_equal (states, hmm.predict (x, low_memory=True)))
+
+
+
+if __name__ == '__main__':
+
+    unittest.main()
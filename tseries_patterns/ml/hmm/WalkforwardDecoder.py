@@ -0,0 +1,267 @@
+#
+# MIT License
+#
+# Copyright (c) 2020 Jonathan Shore
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+
+import unittest
+import numpy as np
+import pandas as pd
+
+from tseries_patterns.ml.hmm.HMMKernels import walkforward, log_parameters
+from tseries_patterns.ml.hmm.EmissionEngine import EmissionEngine
+
+
+class WalkforwardDecoder:
+    """
+    Incremental walk-forward HMM decoder.  For each new observation yields the last state of the viterbi
+    path over the trailing `window` observations (the WalkforwardHMM semantics), advancing one observation
+    at a time rather than re-decoding the window:
+
+    - with a finite window, the trailing-window max-product recursion is maintained exactly with a two-stack
+      sliding window over (max, +) transition-emission products.  Each observation's emission log-probabilities
+      are evaluated once, and the cost is O(K^3) amortized per observation (8 or 27 operations for 2 and 3
+      state models), versus O(window * K^2) to re-run viterbi per point.
+    - with window = None, decoding is unbounded: the state is the argmax of the viterbi recursion from the
+      start of the series (online viterbi), in O(K^2) per observation.
+
+    The finite-window result equals re-running viterbi on each trailing window up to floating point ties.
+    """
+
+    def __init__(self, distributions, transition_matrix, state_probs, window = 50):
+        """
+        :param distributions: list of distribution functions, each provided with observation vector yields log prob vector
+        :param transition_matrix: transition probabilities
+        :param state_probs: prior probability of being in any given state
+        :param window: trailing window length, or None for unbounded (online viterbi) decoding
+        """
+        self.distributions = distributions
+        self.engine = EmissionEngine(distributions)
+        self.nstates = len(state_probs)
+        self.window = window
+
+        self._logpi, self._logA = log_parameters(state_probs, transition_matrix)
+
+        self.reset()
+
+
+    def reset (self):
+        """
+        Reset to start of a new series
+        """
+        self._t = -1
+        self._delta = None
+
+        # two-stack state: front vectors for window starts [front_start, m], back product M(m+1 .. t)
+        self._m = -1
+        self._front = None
+        self._front_start = 0
+        self._back = None
+        self._pending = []
+
+
+    def update (self, x: float) -> int:
+        """
+        Advance by one observation
+
+        :param x: observation
+        :return: state for the observation
+        """
+        e = self.engine(np.array([x], dtype=float))[0]
+        return self._step(e)
+
+
+    def decode (self, x):
+        """
+        Decode series, continuing from any prior state of the decoder.  A decoder at the start of a series
+        decodes with the compiled walkforward kernel, leaving the decoder ready to continue with update().
+
+        :param x: series of observations
+        :return: state for each observation (as series if given a series)
+        """
+        values = np.asarray(x.values if isinstance(x, pd.Series) else x, dtype=float)
+        E = self.emissions(values)
+
+        if self._t < 0 and E.shape[0] > 0:
+            states = self._decode_kernel(E)
+        else:
+            states = np.empty(E.shape[0], dtype=np.int64)
+            for i in range(E.shape[0]):
+                states[i] = self._step(E[i])
+
+        if isinstance(x, pd.Series):
+            return pd.Series(states, index=x.index)
+        else:
+            return states
+
+
+    def emissions (self, x) -> np.ndarray:
+        """
+        Emission log-probabilities, one row per observation and column per state
+        """
+        return self.engine(np.asarray(x, dtype=float))
+
+
+    #
+    #   Implementation
+    #
+
+    def _decode_kernel (self, E: np.ndarray) -> np.ndarray:
+        n = E.shape[0]
+        states, delta = walkforward(E, self._logpi, self._logA, self.window)
+
+        # continue from here as if stepped: unbounded state is the viterbi vector, windowed state the pending
+        # emissions of the next window (with an empty front stack, forcing a flip on the next step)
+        self._t = n - 1
+        if self.window is None:
+            self._delta = delta
+        else:
+            self._m = -1
+            self._front = None
+            self._back = None
+            self._pending = list(np.array(E[max(0, n + 1 - self.window):]))
+
+        return states
+
+
+    def _step (self, e: np.ndarray) -> int:
+        self._t += 1
+        if self.window is None:
+            return self._step_unbounded(e)
+        else:
+            return self._step_window(e)
+
+
+    def _step_unbounded (self, e: np.ndarray) -> int:
+        if self._delta is None:
+            delta = self._logpi + e
+        else:
+            delta = np.max(self._delta[:,None] + self._logA, axis=0) + e
+
+        # renormalize to keep values bounded (argmax is unaffected)
+        self._delta = delta - np.max(delta)
+        return int(np.argmax(delta))
+
+
+    def _step_window (self, e: np.ndarray) -> int:
+        t = self._t
+        s = max(0, t - self.window + 1)
+        self._pending.append(e)
+
+        if s > self._m:
+            self._flip()
+        else:
+            M = self._logA + e[None,:]
+            self._back = M if self._back is None else _maxplus(self._back, M)
+
+        F = self._front[s - self._front_start]
+        v = F if self._back is None else np.max(F[:,None] + self._back, axis=0)
+        return int(np.argmax(v))
+
+
+    def _flip (self):
+        """
+        Rebuild front stack for window starts in [s, t] from the pending emissions, emptying the back stack
+        """
+        t = self._t
+        s = max(0, t - self.window + 1)
+        rows = self._pending[len(self._pending) - (t - s + 1):]
+
+        front = np.empty((t - s + 1, self.nstates))
+        front[-1] = self._logpi + rows[-1]
+
+        P = None
+        for i in range(t - s - 1, -1, -1):
+            M = self._logA + rows[i+1][None,:]
+            P = M if P is None else _maxplus(M, P)
+            front[i] = np.max((self._logpi + rows[i])[:,None] + P, axis=0)
+
+        self._front = front
+        self._front_start = s
+        self._m = t
+        self._back = None
+        self._pending = []
+
+
+def _maxplus (A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """
+    (max, +) matrix product
+    """
+    return np.max(A[:,:,None] + B[None,:,:], axis=1)
+
+
+##
+##  UNIT TESTS
+##
+
+class TestWalkforwardDecoder(unittest.TestCase):
+
+    def setUp(self):
+        from tseries_patterns.math.distributions import NormalDistribution
+
+        rng = np.random.default_rng(1)
+        states = np.cumsum(rng.random(400) > 0.95) % 3
+        self._x = np.array([-1.0, 0.0, 1.0])[states] + rng.normal(0.0, 0.6, 400)
+
+        self._distributions = [NormalDistribution(mu, 0.6).logf for mu in (-1.0, 0.0, 1.0)]
+        self._transmat = np.array([[0.9, 0.05, 0.05], [0.05, 0.9, 0.05], [0.05, 0.05, 0.9]])
+        self._pi = np.array([0.4, 0.3, 0.3])
+
+
+    def _bruteforce(self, window):
+        """
+        Last state of a (numpy) viterbi over the trailing window ending at each observation
+        """
+        E = np.column_stack([f(self._x.reshape(-1,1)).flatten() for f in self._distributions])
+        logpi, logA = np.log(self._pi), np.log(self._transmat)
+
+        states = np.empty(len(self._x), dtype=np.int64)
+        for t in range(len(self._x)):
+            start = 0 if window is None else max(0, t - window + 1)
+            delta = logpi + E[start]
+            for i in range(start + 1, t + 1):
+                delta = np.max(delta[:,None] + logA, axis=0) + E[i]
+            states[t] = np.argmax(delta)
+        return states
+
+
+    def test_decode(self):
+        for window in (1, 7, 50, None):
+            expected = self._bruteforce (window)
+            decoder = WalkforwardDecoder (self._distributions, self._transmat, self._pi, window=window)
+
+            series = pd.Series(self._x)
+            self.assertTrue (np.array_equal (decoder.decode (series).values, expected))
+
+            decoder.reset()
+            self.assertTrue (np.array_equal (decoder.decode (self._x), expected))
+
+            decoder.reset()
+            stepped = [decoder.update (x) for x in self._x[:100]]
+            stepped = np.concatenate ((stepped, decoder.decode (series.iloc[100:]).values))
+            self.assertTrue (np.array_equal (stepped, expected))
+
+
+
+if __name__ == '__main__':
+
+    unittest.main()
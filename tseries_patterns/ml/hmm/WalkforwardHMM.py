@@ -25,11 +25,14 @@
 
 import numpy as np
 import pandas as pd
-import multiprocessing as mp
-from math import ceil
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from math import sin
 
-from tseries_patterns.ml.hmm import HMM
+from tseries_patterns.common import stage
+from tseries_patterns.ml.hmm.HMM import HMM
+from tseries_patterns.ml.hmm.SparseTransitions import dense
+from tseries_patterns.ml.hmm.WalkforwardDecoder import WalkforwardDecoder
 from tseries_patterns.math.distributions import NormalDistribution
 
 
@@ -39,65 +42,155 @@ class WalkforwardHMM:
         Generic HMM is supplied with a distribution function, one per state
 
         :param distributions: list of distribution functions, each provided with observation vector yields log prob vector
-        :param transition_matrix: transition probabilities
+        :param transition_matrix: transition probabilities (dense, scipy.sparse, or SparseTransitions)
         :param state_probs: prior probability of being in any given state
         """
         self.distributions = distributions
-        self.transition_matrix = transition_matrix
+        self.transition_matrix = dense(transition_matrix)
         self.state_probs = state_probs
         self.window = window
+        self._pool = None
+        self._cores = None
 
 
-    def fit(self, x):
+    def fit(self, x, lengths=None, **kwargs):
         """
-        Train HMM, adjusting an variable not given
-        :param X: series of states to train over
+        Train the underlying HMM with Baum-Welch (see HMM.fit), updating the transition matrix, state
+        probabilities, and distribution parameters
+
+        :param x: series of observations to train over (the concatenated sequences if lengths given)
+        :param lengths: (optional) lengths of the individual sequences in x
+        :param kwargs: EM options passed to HMM.fit (n_iter, tol, restarts, processes, seed)
+        :return: self
         """
-        raise "fit not implemented"
+        hmm = HMM (self.distributions, self.transition_matrix, self.state_probs)
+        hmm.fit(x, lengths=lengths, **kwargs)
+
+        self.transition_matrix = hmm.transmat_
+        self.state_probs = hmm.startprob_
+        return self
 
 
-    def predict(self, x, cores=12):
+    def predict(self, x, cores=12, incremental=False):
         """
-        Predict state sequence
+        Predict state sequence, one state per observation (the last state of the viterbi path over the
+        trailing window ending at that observation).
+
+        The series is placed in shared memory and divided into one contiguous chunk per core, each worker
+        decoding its chunk (with `window - 1` points of leading context) and writing states directly into a
+        shared output vector.  The worker pool is created on first use and kept for subsequent calls; use
+        close() or a `with` block to release it.  Without a window (window=None) every state depends on the
+        whole prefix of the series, so the series is decoded in-process on a single core instead.
+
+        :param x: series of observations
+        :param cores: number of cores to parallelize across
+        :param incremental: if true decode in-process with the incremental WalkforwardDecoder, yielding one
+               state per observation with each emission evaluated once (rather than once per window)
         """
-        len = x.shape[0]
-        chunk = max(1, int(ceil(float(len) / cores)))
+        if incremental or self.window is None:
+            return self.decoder().decode(pd.Series(x) if not isinstance(x, pd.Series) else x)
 
-        if isinstance(x, pd.Series):
-            x = x.values
+        index = x.index if isinstance(x, pd.Series) else None
+        values = x.values if isinstance(x, pd.Series) else np.asarray(x)
+        n = values.shape[0]
+        if n == 0:
+            return pd.Series(np.empty(0, dtype=np.int64), index=index)
 
-        def section(i):
-            Iend = len - i
-            Istart = max(0,Iend - chunk)
-            return x[Istart:Iend]
+        cores = max(1, min(cores, n))
+        bounds = np.linspace(0, n, cores + 1).astype(np.int64)
 
-        jobs = [
-            [section(i), self.distributions, self.transition_matrix, self.state_probs, self.window]
-            for i in range(0,len,self.window)]
+        with stage ("WalkforwardHMM.shm", n):
+            shm_in = shared_memory.SharedMemory(create=True, size=n * 8)
+            shm_out = shared_memory.SharedMemory(create=True, size=n * 8)
 
-        with mp.Pool() as pool:
-            results = pool.map(_parallel_hmm, jobs)
+        try:
+            with stage ("WalkforwardHMM.jobs", n):
+                xin = np.ndarray((n,), dtype=np.double, buffer=shm_in.buf)
+                xin[:] = values
+                del xin
 
-        return pd.concat(results).reset_index(drop=True)
+                model = (self.distributions, self.transition_matrix, self.state_probs, self.window)
+                jobs = [
+                    (model, shm_in.name, shm_out.name, n, int(bounds[i]), int(bounds[i+1]))
+                    for i in range(cores) if bounds[i+1] > bounds[i]]
 
+            with stage ("WalkforwardHMM.pool", n):
+                for _ in self._executor(cores).map(_walkforward_worker, jobs):
+                    pass
+
+            with stage ("WalkforwardHMM.output", n):
+                states = np.array(np.ndarray((n,), dtype=np.int64, buffer=shm_out.buf))
+        finally:
+            for shm in (shm_in, shm_out):
+                shm.close()
+                shm.unlink()
+
+        return pd.Series(states, index=index)
 
-##
-## External parallel function to run HMM on a core
-##
-def _parallel_hmm(job):
-    section, dist, transitions, stateprob, window = job
-    hmm = HMM (dist,transitions, stateprob)
 
-    results = []
-    for i in range(0,section.shape[0]):
-        Iend = i+1
-        Istart = max(Iend - window, 0)
+    def decoder(self) -> WalkforwardDecoder:
+        """
+        Incremental decoder with the same model and window, for streaming one observation at a time
+        """
+        return WalkforwardDecoder (self.distributions, self.transition_matrix, self.state_probs, window=self.window)
+
+
+    def close(self):
+        """
+        Shut down the worker pool (if any)
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._cores = None
 
-        sub = section[Istart:Iend]
-        states = hmm.predict(sub)
-        results.append(states[-1])
 
-    return pd.Series(results)
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        state["_cores"] = None
+        return state
+
+
+    def _executor(self, cores: int) -> ProcessPoolExecutor:
+        """
+        Get long-lived executor sized to the requested # of cores
+        """
+        if self._pool is None or self._cores != cores:
+            self.close()
+            self._pool = ProcessPoolExecutor(max_workers=cores)
+            self._cores = cores
+        return self._pool
+
+
+##
+## External parallel function to decode a contiguous chunk [start, end) on a core
+##
+def _walkforward_worker(job):
+    model, name_in, name_out, n, start, end = job
+    dist, transitions, stateprob, window = model
+
+    shm_in = shared_memory.SharedMemory(name=name_in)
+    shm_out = shared_memory.SharedMemory(name=name_out)
+    try:
+        x = np.ndarray((n,), dtype=np.double, buffer=shm_in.buf)
+        out = np.ndarray((n,), dtype=np.int64, buffer=shm_out.buf)
+
+        context = max(0, start - window + 1)
+        decoder = WalkforwardDecoder (dist, transitions, stateprob, window=window)
+        states = decoder.decode(x[context:end])
+        out[start:end] = states[start - context:]
+        del x, out
+    finally:
+        shm_in.close()
+        shm_out.close()
 
 
 #
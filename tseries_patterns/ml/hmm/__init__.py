@@ -5,3 +5,8 @@ from .HMM3State import HMM3State
 from .HMMExponential2State import HMMExponential2State
 from .WalkforwardHMM import WalkforwardHMM
 
+from .WalkforwardDecoder import WalkforwardDecoder
+from .EmissionEngine import EmissionEngine
+from .HMMFilter import HMMFilter
+from .HMMGridSearch import HMMGridSearch
+from .SparseTransitions import SparseTransitions